@@ -0,0 +1,30 @@
+"""add pending area to processing batches
+
+Revision ID: 5b7e2c41d9a3
+Revises: e8cf63908560
+Create Date: 2026-10-17 04:30:12.418203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import geoalchemy2
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e2c41d9a3'
+down_revision: Union[str, None] = 'e8cf63908560'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Part of the area of interest left to process after reusing the events
+    # of previous batches (NULL: the whole area)
+    op.add_column('processing_batches',
+        sa.Column('pending_area', geoalchemy2.types.Geometry(geometry_type='MULTIPOLYGON', srid=4326, spatial_index=False), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('processing_batches', 'pending_area')
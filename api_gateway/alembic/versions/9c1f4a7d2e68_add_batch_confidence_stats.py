@@ -0,0 +1,48 @@
+"""add batch confidence stats
+
+Revision ID: 9c1f4a7d2e68
+Revises: 5b7e2c41d9a3
+Create Date: 2026-10-17 04:41:53.902114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '9c1f4a7d2e68'
+down_revision: Union[str, None] = '5b7e2c41d9a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Events of a batch above a confidence (listing, statistics fallback)
+    op.create_index('ix_deforestation_events_batch_confidence', 'deforestation_events', ['batch_id', 'confidence_score'], unique=False)
+
+    # Per batch statistics, one row per confidence bucket of 0.01
+    op.create_table('batch_confidence_stats',
+        sa.Column('batch_id', sa.Integer(), nullable=False),
+        sa.Column('bucket', sa.SmallInteger(), nullable=False),
+        sa.Column('event_count', sa.Integer(), nullable=False),
+        sa.Column('area_hectares', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['batch_id'], ['processing_batches.id'], ),
+        sa.PrimaryKeyConstraint('batch_id', 'bucket')
+    )
+
+    # Statistics of the existing events
+    op.execute("""
+        INSERT INTO batch_confidence_stats (batch_id, bucket, event_count, area_hectares)
+        SELECT batch_id,
+               GREATEST(LEAST(FLOOR(confidence_score * 100 + 1e-9), 99), 0) AS bucket,
+               COUNT(*),
+               SUM(area_hectares)
+        FROM deforestation_events
+        GROUP BY batch_id, bucket
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('batch_confidence_stats')
+    op.drop_index('ix_deforestation_events_batch_confidence', table_name='deforestation_events')
@@ -1,26 +1,24 @@
-from typing import Generator, Optional
+from typing import AsyncGenerator
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
-from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import AsyncSessionLocal
 from app.core.config import settings
+from app.core.user_cache import user_cache
 from app.services import user_service
-from app.schemas.schemas import TokenPayload
+from app.schemas.schemas import TokenPayload, User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
-def get_db() -> Generator:
-    try:
-        db = SessionLocal()
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def get_current_user(
-    db: Session = Depends(get_db),
+async def get_current_user(
+    db: AsyncSession = Depends(get_db),
     token: str = Depends(oauth2_scheme)
-) -> Optional[dict]:
+) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -33,8 +31,26 @@ def get_current_user(
         token_data = TokenPayload(**payload)
     except JWTError:
         raise credentials_exception
-    
-    user = user_service.get_user_by_id(db, int(token_data.sub))
+
+    # The session only checks out a connection on its first query, a cache
+    # hit doesn't touch the database
+    user_id = int(token_data.sub)
+    user = await user_cache.get(user_id, token)
     if user is None:
-        raise credentials_exception
-    return user 
\ No newline at end of file
+        db_user = await user_service.get_user_by_id(db, user_id)
+        if db_user is None:
+            raise credentials_exception
+        user = User.model_validate(db_user)
+
+        # End the read transaction to give the connection back to the pool
+        # while the rest of the request runs
+        await db.commit()
+        if user.is_active:
+            await user_cache.set(user_id, token, user)
+
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Inactive user",
+        )
+    return user
\ No newline at end of file
@@ -0,0 +1,26 @@
+import json
+from typing import Iterator, List, Optional
+from fastapi.responses import StreamingResponse
+
+GEOJSON_MEDIA_TYPE = "application/geo+json"
+
+def feature_collection_response(
+    features: List[str],
+    next_after_id: Optional[int] = None,
+    chunk_size: int = 500
+) -> StreamingResponse:
+    """
+    Stream a GeoJSON FeatureCollection from Features already serialized by
+    the database, next_after_id is added for the keyset pagination
+    """
+    def chunks() -> Iterator[str]:
+        yield '{"type":"FeatureCollection","features":['
+        for i in range(0, len(features), chunk_size):
+            separator = "," if i > 0 else ""
+            yield separator + ",".join(features[i:i + chunk_size])
+        yield '],"next_after_id":' + json.dumps(next_after_id) + "}"
+
+    headers = {}
+    if next_after_id is not None:
+        headers["X-Next-After-Id"] = str(next_after_id)
+    return StreamingResponse(chunks(), media_type=GEOJSON_MEDIA_TYPE, headers=headers)
\ No newline at end of file
@@ -1,7 +1,8 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, places, processing
+from app.api.v1.endpoints import auth, places, processing, tiles
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
 api_router.include_router(places.router, prefix="/places", tags=["places"])
-api_router.include_router(processing.router, prefix="/processing", tags=["processing"]) 
\ No newline at end of file
+api_router.include_router(processing.router, prefix="/processing", tags=["processing"]) 
+api_router.include_router(tiles.router, prefix="/tiles", tags=["tiles"])
\ No newline at end of file
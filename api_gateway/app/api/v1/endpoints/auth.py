@@ -2,7 +2,7 @@ from datetime import timedelta
 from typing import Any
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.api import deps
 from app.core import security
 from app.core.config import settings
@@ -12,14 +12,14 @@ from app.schemas.schemas import Token, UserCreate, User
 router = APIRouter()
 
 @router.post("/login", response_model=Token)
-def login(
-    db: Session = Depends(deps.get_db),
+async def login(
+    db: AsyncSession = Depends(deps.get_db),
     form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Any:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = user_service.authenticate(
+    user = await user_service.authenticate(
         db, email=form_data.username, password=form_data.password
     )
     if not user:
@@ -42,25 +42,25 @@ def login(
     }
 
 @router.post("/signup", response_model=User)
-def create_user(
+async def create_user(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     user_in: UserCreate,
 ) -> Any:
     """
     Create new user.
     """
-    user = user_service.get_user_by_email(db, email=user_in.email)
+    user = await user_service.get_user_by_email(db, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="The user with this email already exists in the system.",
         )
-    user = user_service.create_user(db, user_in)
+    user = await user_service.create_user(db, user_in)
     return user
 
 @router.get("/me", response_model=User)
-def read_users_me(
+async def read_users_me(
     current_user: User = Depends(deps.get_current_user),
 ) -> Any:
     """
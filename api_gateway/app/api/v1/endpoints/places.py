@@ -1,7 +1,8 @@
-from typing import Any, List
+from typing import Any, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.api import deps
+from app.api.responses import feature_collection_response
 from app.services import place_service
 from app.schemas.schemas import Place, PlaceCreate, PlaceUpdate, User
 
@@ -20,21 +21,21 @@ def serialize_place(place):
     }
 
 @router.post("/", response_model=Place)
-def create_place(
+async def create_place(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     place_in: PlaceCreate,
     current_user: User = Depends(deps.get_current_user)
 ) -> Any:
     """
     Crear un nuevo lugar.
     """
-    place = place_service.create_place(db=db, place_in=place_in, user_id=current_user.id)
+    place = await place_service.create_place(db=db, place_in=place_in, user_id=current_user.id)
     return serialize_place(place)
 
 @router.get("/", response_model=List[Place])
-def get_places(
-    db: Session = Depends(deps.get_db),
+async def get_places(
+    db: AsyncSession = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(deps.get_current_user)
@@ -42,22 +43,22 @@ def get_places(
     """
     Obtener lugares del usuario actual.
     """
-    places = place_service.get_places_by_user(
+    places = await place_service.get_places_by_user(
         db=db, user_id=current_user.id, skip=skip, limit=limit
     )
     return [serialize_place(place) for place in places]
 
 @router.get("/{place_id}", response_model=Place)
-def get_place(
+async def get_place(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     place_id: int,
     current_user: User = Depends(deps.get_current_user)
 ) -> Any:
     """
     Obtener un lugar por ID.
     """
-    place = place_service.get_place(db=db, place_id=place_id)
+    place = await place_service.get_place(db=db, place_id=place_id)
     if not place:
         raise HTTPException(status_code=404, detail="Place not found")
     if place.user_id != current_user.id:
@@ -65,9 +66,9 @@ def get_place(
     return serialize_place(place)
 
 @router.put("/{place_id}", response_model=Place)
-def update_place(
+async def update_place(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     place_id: int,
     place_in: PlaceUpdate,
     current_user: User = Depends(deps.get_current_user)
@@ -75,36 +76,36 @@ def update_place(
     """
     Actualizar un lugar.
     """
-    place = place_service.get_place(db=db, place_id=place_id)
+    place = await place_service.get_place(db=db, place_id=place_id)
     if not place:
         raise HTTPException(status_code=404, detail="Place not found")
     if place.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    place = place_service.update_place(db=db, db_obj=place, obj_in=place_in)
+    place = await place_service.update_place(db=db, db_obj=place, obj_in=place_in)
     return serialize_place(place)
 
 @router.delete("/{place_id}", response_model=Place)
-def delete_place(
+async def delete_place(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     place_id: int,
     current_user: User = Depends(deps.get_current_user)
 ) -> Any:
     """
     Eliminar un lugar.
     """
-    place = place_service.get_place(db=db, place_id=place_id)
+    place = await place_service.get_place(db=db, place_id=place_id)
     if not place:
         raise HTTPException(status_code=404, detail="Place not found")
     if place.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    place = place_service.delete_place(db=db, place_id=place_id)
+    place = await place_service.delete_place(db=db, place_id=place_id)
     return serialize_place(place)
 
 @router.get("/bbox/", response_model=List[Place])
-def get_places_in_bbox(
+async def get_places_in_bbox(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     min_lon: float = Query(..., description="Longitud mínima del bounding box"),
     min_lat: float = Query(..., description="Latitud mínima del bounding box"),
     max_lon: float = Query(..., description="Longitud máxima del bounding box"),
@@ -114,7 +115,7 @@ def get_places_in_bbox(
     """
     Obtener lugares dentro de un bounding box.
     """
-    places = place_service.get_places_in_bbox(
+    places = await place_service.get_places_in_bbox(
         db=db,
         min_lon=min_lon,
         min_lat=min_lat,
@@ -124,9 +125,9 @@ def get_places_in_bbox(
     return [serialize_place(place) for place in places]
 
 @router.get("/nearby/", response_model=List[Place])
-def get_places_within_distance(
+async def get_places_within_distance(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     lat: float = Query(..., description="Latitud del punto central"),
     lon: float = Query(..., description="Longitud del punto central"),
     distance: float = Query(..., description="Distancia en metros"),
@@ -135,10 +136,34 @@ def get_places_within_distance(
     """
     Obtener lugares dentro de una distancia específica de un punto.
     """
-    places = place_service.get_places_within_distance(
+    places = await place_service.get_places_within_distance(
         db=db,
         lat=lat,
         lon=lon,
         distance_meters=distance
     )
-    return [serialize_place(place) for place in places] 
\ No newline at end of file
+    return [serialize_place(place) for place in places] 
+
+@router.get("/geojson/")
+async def get_places_geojson(
+    *,
+    db: AsyncSession = Depends(deps.get_db),
+    after_id: Optional[int] = Query(None, description="Último ID de la página anterior"),
+    limit: int = Query(1000, ge=1, le=10000),
+    precision: int = Query(6, ge=0, le=15, description="Decimales de las coordenadas"),
+    simplify: float = Query(0.0, ge=0, description="Tolerancia de simplificación en grados"),
+    current_user: User = Depends(deps.get_current_user)
+) -> Any:
+    """
+    Obtener los lugares del usuario actual como FeatureCollection GeoJSON
+    generada por PostGIS, paginada por ID.
+    """
+    features, next_after_id = await place_service.get_place_features(
+        db=db,
+        user_id=current_user.id,
+        after_id=after_id,
+        limit=limit,
+        precision=precision,
+        simplify=simplify
+    )
+    return feature_collection_response(features, next_after_id)
\ No newline at end of file
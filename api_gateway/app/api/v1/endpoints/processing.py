@@ -1,8 +1,9 @@
-from typing import Any, List
+from typing import Any, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.api import deps
-from app.services import processing_service
+from app.api.responses import feature_collection_response
+from app.services import processing_service, statistics_service
 from app.schemas.schemas import (
     ProcessingBatch,
     ProcessingBatchCreate,
@@ -12,37 +13,44 @@ from app.schemas.schemas import (
 
 router = APIRouter()
 
+def serialize_batch(batch):
+    """Serialize a processing batch with its geometries as GeoJSON"""
+    return {
+        "id": batch.id,
+        "area_of_interest": batch.geojson,
+        "start_date": batch.start_date,
+        "end_date": batch.end_date,
+        "place_id": batch.place_id,
+        "status": batch.status,
+        "processed_at": batch.processed_at,
+        "completed_at": batch.completed_at,
+        "error_message": batch.error_message,
+        "user_id": batch.user_id,
+        "pending_area": batch.pending_geojson
+    }
+
 @router.post("/batch/", response_model=ProcessingBatch)
-def create_batch(
+async def create_batch(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     batch_in: ProcessingBatchCreate,
     current_user: User = Depends(deps.get_current_user)
 ) -> Any:
     """
-    Create a new processing batch.
+    Create a new processing batch. The events of completed batches covering
+    the area and period are reused, only pending_area is left to process
+    (the batch is completed at once when nothing is left).
     """
-    # Check if area has been processed
-    if processing_service.check_area_processed(
-        db=db,
-        geometry=batch_in.area_of_interest,
-        start_date=batch_in.start_date,
-        end_date=batch_in.end_date
-    ):
-        raise HTTPException(
-            status_code=400,
-            detail="This area has already been processed for the specified time period"
-        )
-    
-    return processing_service.create_processing_batch(
+    batch = await processing_service.create_processing_batch(
         db=db,
         batch_in=batch_in,
         user_id=current_user.id
     )
+    return serialize_batch(batch)
 
 @router.get("/batch/", response_model=List[ProcessingBatch])
-def get_batches(
-    db: Session = Depends(deps.get_db),
+async def get_batches(
+    db: AsyncSession = Depends(deps.get_db),
     skip: int = 0,
     limit: int = 100,
     current_user: User = Depends(deps.get_current_user)
@@ -50,34 +58,35 @@ def get_batches(
     """
     Get all processing batches for current user.
     """
-    return processing_service.get_user_processing_batches(
+    batches = await processing_service.get_user_processing_batches(
         db=db,
         user_id=current_user.id,
         skip=skip,
         limit=limit
     )
+    return [serialize_batch(batch) for batch in batches]
 
 @router.get("/batch/{batch_id}", response_model=ProcessingBatch)
-def get_batch(
+async def get_batch(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     batch_id: int,
     current_user: User = Depends(deps.get_current_user)
 ) -> Any:
     """
     Get a specific processing batch.
     """
-    batch = processing_service.get_processing_batch(db=db, batch_id=batch_id)
+    batch = await processing_service.get_processing_batch(db=db, batch_id=batch_id)
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
     if batch.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    return batch
+    return serialize_batch(batch)
 
 @router.get("/batch/{batch_id}/events", response_model=List[DeforestationEvent])
-def get_batch_events(
+async def get_batch_events(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     batch_id: int,
     min_confidence: float = Query(0.0, ge=0, le=1),
     current_user: User = Depends(deps.get_current_user)
@@ -85,22 +94,55 @@ def get_batch_events(
     """
     Get all deforestation events for a batch.
     """
-    batch = processing_service.get_processing_batch(db=db, batch_id=batch_id)
+    batch = await processing_service.get_processing_batch(db=db, batch_id=batch_id)
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
     if batch.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    return processing_service.get_batch_events(
+    return await processing_service.get_batch_events(
         db=db,
         batch_id=batch_id,
         min_confidence=min_confidence
     )
 
+@router.get("/batch/{batch_id}/events/geojson")
+async def get_batch_events_geojson(
+    *,
+    db: AsyncSession = Depends(deps.get_db),
+    batch_id: int,
+    min_confidence: float = Query(0.0, ge=0, le=1),
+    after_id: Optional[int] = Query(None, description="Last event ID of the previous page"),
+    limit: int = Query(1000, ge=1, le=10000),
+    precision: int = Query(6, ge=0, le=15, description="Number of decimals of the coordinates"),
+    simplify: float = Query(0.0, ge=0, description="Simplification tolerance in degrees"),
+    current_user: User = Depends(deps.get_current_user)
+) -> Any:
+    """
+    Get the deforestation events of a batch as a GeoJSON FeatureCollection
+    built by PostGIS, paginated by event ID.
+    """
+    batch = await processing_service.get_processing_batch(db=db, batch_id=batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if batch.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    features, next_after_id = await processing_service.get_batch_event_features(
+        db=db,
+        batch_id=batch_id,
+        min_confidence=min_confidence,
+        after_id=after_id,
+        limit=limit,
+        precision=precision,
+        simplify=simplify
+    )
+    return feature_collection_response(features, next_after_id)
+
 @router.get("/batch/{batch_id}/total-area")
-def get_total_deforestation(
+async def get_total_deforestation(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     batch_id: int,
     min_confidence: float = Query(0.7, ge=0, le=1),
     current_user: User = Depends(deps.get_current_user)
@@ -108,13 +150,13 @@ def get_total_deforestation(
     """
     Get total deforested area for a batch.
     """
-    batch = processing_service.get_processing_batch(db=db, batch_id=batch_id)
+    batch = await processing_service.get_processing_batch(db=db, batch_id=batch_id)
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
     if batch.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
     
-    total_area = processing_service.get_total_deforestation_area(
+    total_area = await processing_service.get_total_deforestation_area(
         db=db,
         batch_id=batch_id,
         min_confidence=min_confidence
@@ -124,4 +166,49 @@ def get_total_deforestation(
         "batch_id": batch_id,
         "total_area_hectares": total_area,
         "min_confidence": min_confidence
-    } 
\ No newline at end of file
+    } 
+
+@router.get("/batch/{batch_id}/statistics")
+async def get_batch_statistics(
+    *,
+    db: AsyncSession = Depends(deps.get_db),
+    batch_id: int,
+    current_user: User = Depends(deps.get_current_user)
+) -> Any:
+    """
+    Get the number of events and the total deforested area of a batch.
+    """
+    batch = await processing_service.get_processing_batch(db=db, batch_id=batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if batch.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    return await statistics_service.get_batch_statistics(db=db, batch_id=batch_id)
+
+@router.get("/batch/{batch_id}/histogram")
+async def get_batch_confidence_histogram(
+    *,
+    db: AsyncSession = Depends(deps.get_db),
+    batch_id: int,
+    bins: int = Query(10, ge=1, le=100, description="Number of confidence bins, must divide 100"),
+    current_user: User = Depends(deps.get_current_user)
+) -> Any:
+    """
+    Get the number of events and the deforested area of a batch per
+    confidence bin.
+    """
+    if statistics_service.NB_BUCKETS % bins != 0:
+        raise HTTPException(status_code=400, detail="bins must divide 100")
+    batch = await processing_service.get_processing_batch(db=db, batch_id=batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if batch.user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    histogram = await statistics_service.get_confidence_histogram(
+        db=db,
+        batch_id=batch_id,
+        bins=bins
+    )
+    return {"batch_id": batch_id, "bins": histogram}
\ No newline at end of file
@@ -0,0 +1,56 @@
+import hashlib
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api import deps
+from app.core.config import settings
+from app.services import tile_service
+from app.schemas.schemas import User
+
+router = APIRouter()
+
+MVT_MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+
+@router.get("/{layer}/{z}/{x}/{y}.pbf")
+async def get_tile(
+    *,
+    db: AsyncSession = Depends(deps.get_db),
+    request: Request,
+    layer: str,
+    z: int,
+    x: int,
+    y: int,
+    batch_id: Optional[int] = None,
+    min_confidence: float = Query(0.0, ge=0, le=1),
+    current_user: User = Depends(deps.get_current_user)
+) -> Response:
+    """
+    Get a vector tile (Mapbox Vector Tile) of the places or the deforestation
+    events of the current user, optionally restricted to one batch.
+    """
+    if layer not in tile_service.LAYERS:
+        raise HTTPException(status_code=404, detail="Layer not found")
+    if not 0 <= z <= tile_service.MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="Invalid tile coordinates")
+
+    tile = await tile_service.get_tile(
+        db=db,
+        layer=layer,
+        z=z,
+        x=x,
+        y=y,
+        user_id=current_user.id,
+        batch_id=batch_id,
+        min_confidence=min_confidence
+    )
+
+    # Tiles are per user, they may be cached by the browser only
+    etag = f'"{hashlib.md5(tile).hexdigest()}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={settings.TILE_CACHE_MAX_AGE}",
+        "Vary": "Authorization",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=tile, media_type=MVT_MEDIA_TYPE, headers=headers)
\ No newline at end of file
@@ -26,10 +26,39 @@ class Settings(BaseSettings):
             path=values.get("POSTGRES_DB") or ""
         )
 
+    # Same database, through the asyncpg driver used by the API
+    ASYNC_SQLALCHEMY_DATABASE_URI: Optional[str] = None
+
+    @validator("ASYNC_SQLALCHEMY_DATABASE_URI", pre=True, always=True)
+    def assemble_async_db_connection(cls, v: Optional[str], values: dict[str, any]) -> any:
+        if isinstance(v, str):
+            return v
+        uri = str(values.get("SQLALCHEMY_DATABASE_URI"))
+        return "postgresql+asyncpg://" + uri.split("://", 1)[1]
+
+    # Connection pool of the API, per process
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Cache of the authenticated users (seconds, 0 disables it), in process
+    # unless a Redis URL is given
+    USER_CACHE_TTL: int = 60
+    USER_CACHE_MAX_SIZE: int = 10000
+    USER_CACHE_REDIS_URL: Optional[str] = None
+
+    # Browser cache lifetime of the vector tiles, in seconds
+    TILE_CACHE_MAX_AGE: int = 300
+
+    # Redis shared by the rate limiters of all the API processes, the limits
+    # are per process when it is not set
+    RATE_LIMIT_REDIS_URL: Optional[str] = None
+
     class Config:
         case_sensitive = True
         env_file = ".env"
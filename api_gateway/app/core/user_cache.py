@@ -0,0 +1,128 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+from app.core.config import settings
+from app.schemas.schemas import User
+
+logger = logging.getLogger(__name__)
+
+def _token_key(token: str) -> str:
+    # Never keep the raw token around, a digest is enough to tell them apart
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class InMemoryUserCache:
+    """Per process TTL cache of the authenticated users, keyed by user id and token"""
+
+    def __init__(self, ttl: int, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries: "OrderedDict[Tuple[int, str], Tuple[float, User]]" = OrderedDict()
+        self.keys_by_user: Dict[int, Set[Tuple[int, str]]] = {}
+
+    async def get(self, user_id: int, token: str) -> Optional[User]:
+        key = (user_id, _token_key(token))
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, user = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return user
+
+    async def set(self, user_id: int, token: str, user: User) -> None:
+        key = (user_id, _token_key(token))
+        self.entries[key] = (time.monotonic() + self.ttl, user)
+        self.entries.move_to_end(key)
+        self.keys_by_user.setdefault(user_id, set()).add(key)
+        # Evict the least recently used entries
+        while len(self.entries) > self.max_size:
+            self._remove(next(iter(self.entries)))
+
+    async def invalidate(self, user_id: int) -> None:
+        for key in self.keys_by_user.pop(user_id, set()):
+            self.entries.pop(key, None)
+
+    def _remove(self, key: Tuple[int, str]) -> None:
+        self.entries.pop(key, None)
+        keys = self.keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_user[key[0]]
+
+class RedisUserCache:
+    """
+    TTL cache of the authenticated users shared by all the API processes.
+    The entries of a user are the fields of one hash, so that invalidation
+    is a single DEL. Redis errors are logged and treated as cache misses,
+    authentication then falls back to the database.
+    """
+
+    def __init__(self, url: str, ttl: int):
+        import redis.asyncio as redis
+        from redis.exceptions import RedisError
+        self.redis = redis.from_url(url)
+        self.errors = RedisError
+        self.ttl = ttl
+
+    @staticmethod
+    def _user_key(user_id: int) -> str:
+        return f"auth:user:{user_id}"
+
+    async def get(self, user_id: int, token: str) -> Optional[User]:
+        try:
+            value = await self.redis.hget(self._user_key(user_id), _token_key(token))
+        except self.errors as e:
+            logger.warning(f"User cache lookup failed: {e}")
+            return None
+        if value is None:
+            return None
+        expires_at, _, data = value.partition(b":")
+        # The hash expiry is refreshed by every new token, check each entry
+        if float(expires_at) <= time.time():
+            return None
+        return User.model_validate_json(data)
+
+    async def set(self, user_id: int, token: str, user: User) -> None:
+        key = self._user_key(user_id)
+        value = f"{time.time() + self.ttl}:".encode() + user.model_dump_json().encode()
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, _token_key(token), value)
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except self.errors as e:
+            logger.warning(f"User cache update failed: {e}")
+
+    async def invalidate(self, user_id: int) -> None:
+        # The user change is already committed, a stale entry lives at most
+        # USER_CACHE_TTL seconds
+        try:
+            await self.redis.delete(self._user_key(user_id))
+        except self.errors as e:
+            logger.error(f"User cache invalidation failed for user {user_id}: {e}")
+
+class NullUserCache:
+    """Cache used when USER_CACHE_TTL is 0, every request hits the database"""
+
+    async def get(self, user_id: int, token: str) -> Optional[User]:
+        return None
+
+    async def set(self, user_id: int, token: str, user: User) -> None:
+        pass
+
+    async def invalidate(self, user_id: int) -> None:
+        pass
+
+def create_user_cache():
+    if settings.USER_CACHE_TTL <= 0:
+        return NullUserCache()
+    if settings.USER_CACHE_REDIS_URL:
+        return RedisUserCache(settings.USER_CACHE_REDIS_URL, settings.USER_CACHE_TTL)
+    return InMemoryUserCache(settings.USER_CACHE_TTL, settings.USER_CACHE_MAX_SIZE)
+
+user_cache = create_user_cache()
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Float
+from sqlalchemy import Column, Integer, SmallInteger, String, ForeignKey, DateTime, Boolean, Float, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from geoalchemy2 import Geometry
@@ -64,6 +64,9 @@ class ProcessingBatch(Base):
     error_message = Column(String)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     place_id = Column(Integer, ForeignKey("places.id"))
+    # Part of the area of interest still to process when the results of
+    # previous batches were reused, NULL means the whole area
+    pending_area = Column(Geometry(geometry_type='MULTIPOLYGON', srid=4326, spatial_index=False))
     
     # Relationships
     user = relationship("User", back_populates="processing_batches")
@@ -77,6 +80,13 @@ class ProcessingBatch(Base):
             return shape.__geo_interface__
         return None
 
+    @property
+    def pending_geojson(self):
+        if self.pending_area is not None:
+            shape = to_shape(self.pending_area)
+            return shape.__geo_interface__
+        return None
+
 class DeforestationEvent(Base):
     __tablename__ = "deforestation_events"
 
@@ -90,9 +100,24 @@ class DeforestationEvent(Base):
     # Relationships
     batch = relationship("ProcessingBatch", back_populates="deforestation_events")
 
+    # Listing of the events of a batch above a confidence
+    __table_args__ = (
+        Index("ix_deforestation_events_batch_confidence", "batch_id", "confidence_score"),
+    )
+
     @property
     def geojson(self):
         if self.affected_area is not None:
             shape = to_shape(self.affected_area)
             return shape.__geo_interface__
-        return None 
\ No newline at end of file
+        return None 
+
+class BatchConfidenceStats(Base):
+    """Number and area of the events of a batch per confidence bucket"""
+    __tablename__ = "batch_confidence_stats"
+
+    batch_id = Column(Integer, ForeignKey("processing_batches.id"), primary_key=True)
+    # Bucket i holds the confidence scores in [i / 100, (i + 1) / 100[
+    bucket = Column(SmallInteger, primary_key=True)
+    event_count = Column(Integer, nullable=False, default=0)
+    area_hectares = Column(Float, nullable=False, default=0.0)
\ No newline at end of file
@@ -103,6 +103,7 @@ class ProcessingBatch(ProcessingBatchBase):
     completed_at: Optional[datetime] = None
     error_message: Optional[str] = None
     user_id: int
+    pending_area: Optional[Dict[str, Any]] = Field(None, description="GeoJSON of the area still to process, null for the whole area")
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -1,3 +1,3 @@
-from . import user_service, place_service
+from . import user_service, place_service, processing_service, statistics_service, tile_service
 
-__all__ = ["user_service", "place_service"] 
\ No newline at end of file
+__all__ = ["user_service", "place_service", "processing_service", "statistics_service", "tile_service"]
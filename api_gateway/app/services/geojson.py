@@ -0,0 +1,31 @@
+from typing import Any, Dict
+from sqlalchemy import func, cast, Text
+from sqlalchemy.dialects.postgresql import JSON
+
+# Precision of the coordinates emitted by PostGIS, 6 decimals is ~0.1m
+DEFAULT_PRECISION = 6
+
+def feature_expression(
+    id_column: Any,
+    geometry: Any,
+    properties: Dict[str, Any],
+    precision: int = DEFAULT_PRECISION,
+    simplify: float = 0.0
+):
+    """
+    SQL expression building a GeoJSON Feature as text in the database, so
+    that rows can be sent without any geometry work in Python. simplify is
+    the simplification tolerance in degrees (0 keeps the geometry as is).
+    """
+    if simplify > 0:
+        geometry = func.ST_SimplifyPreserveTopology(geometry, simplify)
+    properties_args = []
+    for name, column in properties.items():
+        properties_args += [name, column]
+    feature = func.json_build_object(
+        "type", "Feature",
+        "id", id_column,
+        "geometry", cast(func.ST_AsGeoJSON(geometry, precision), JSON),
+        "properties", func.json_build_object(*properties_args)
+    )
+    return cast(feature, Text).label("feature")
\ No newline at end of file
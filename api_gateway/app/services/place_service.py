@@ -1,12 +1,13 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from typing import List, Optional, Tuple
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from geoalchemy2.shape import from_shape, to_shape
 from shapely.geometry import shape
 from app.models.models import Place, User
 from app.schemas.schemas import PlaceCreate, PlaceUpdate
+from app.services.geojson import DEFAULT_PRECISION, feature_expression
 
-def create_place(db: Session, *, place_in: PlaceCreate, user_id: int) -> Place:
+async def create_place(db: AsyncSession, *, place_in: PlaceCreate, user_id: int) -> Place:
     """Crear un nuevo lugar"""
     # Convert GeoJSON to WKB format for storage
     geometry = from_shape(shape(place_in.geometry), srid=4326)
@@ -17,23 +18,25 @@ def create_place(db: Session, *, place_in: PlaceCreate, user_id: int) -> Place:
         user_id=user_id
     )
     db.add(db_place)
-    db.commit()
-    db.refresh(db_place)
+    await db.commit()
+    await db.refresh(db_place)
     
     # Convert geometry to GeoJSON before returning
     return db_place
 
-def get_place(db: Session, place_id: int) -> Optional[Place]:
+async def get_place(db: AsyncSession, place_id: int) -> Optional[Place]:
     """Obtener un lugar por su ID"""
-    place = db.query(Place).filter(Place.id == place_id).first()
-    return place
+    result = await db.execute(select(Place).filter(Place.id == place_id))
+    return result.scalars().first()
 
-def get_places_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[Place]:
+async def get_places_by_user(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100) -> List[Place]:
     """Obtener todos los lugares de un usuario"""
-    places = db.query(Place).filter(Place.user_id == user_id).offset(skip).limit(limit).all()
-    return places
+    result = await db.execute(
+        select(Place).filter(Place.user_id == user_id).offset(skip).limit(limit)
+    )
+    return list(result.scalars().all())
 
-def update_place(db: Session, *, db_obj: Place, obj_in: PlaceUpdate) -> Place:
+async def update_place(db: AsyncSession, *, db_obj: Place, obj_in: PlaceUpdate) -> Place:
     """Actualizar un lugar"""
     update_data = obj_in.model_dump(exclude_unset=True)
     if 'geometry' in update_data:
@@ -43,42 +46,81 @@ def update_place(db: Session, *, db_obj: Place, obj_in: PlaceUpdate) -> Place:
         setattr(db_obj, field, value)
     
     db.add(db_obj)
-    db.commit()
-    db.refresh(db_obj)
+    await db.commit()
+    await db.refresh(db_obj)
     return db_obj
 
-def delete_place(db: Session, *, place_id: int) -> Place:
+async def delete_place(db: AsyncSession, *, place_id: int) -> Place:
     """Eliminar un lugar"""
-    place = db.query(Place).filter(Place.id == place_id).first()
-    db.delete(place)
-    db.commit()
+    place = await get_place(db, place_id)
+    await db.delete(place)
+    await db.commit()
     return place
 
-def get_places_in_bbox(
-    db: Session,
+async def get_places_in_bbox(
+    db: AsyncSession,
     min_lon: float,
     min_lat: float,
     max_lon: float,
     max_lat: float
 ) -> List[Place]:
     """Obtener lugares dentro de un bounding box"""
-    bbox = f'SRID=4326;POLYGON(({min_lon} {min_lat}, {max_lon} {min_lat}, {max_lon} {max_lat}, {min_lon} {max_lat}, {min_lon} {min_lat}))'
-    places = db.query(Place).filter(func.ST_Intersects(Place.geometry, bbox)).all()
-    return places
+    bbox = func.ST_MakeEnvelope(min_lon, min_lat, max_lon, max_lat, 4326)
+    result = await db.execute(select(Place).filter(func.ST_Intersects(Place.geometry, bbox)))
+    return list(result.scalars().all())
 
-def get_places_within_distance(
-    db: Session,
+async def get_places_within_distance(
+    db: AsyncSession,
     lat: float,
     lon: float,
     distance_meters: float
 ) -> List[Place]:
     """Obtener lugares dentro de una distancia específica de un punto"""
-    point = f'SRID=4326;POINT({lon} {lat})'
-    places = db.query(Place).filter(
-        func.ST_DWithin(
-            func.ST_Transform(Place.geometry, 3857),
-            func.ST_Transform(func.ST_GeomFromEWKT(point), 3857),
-            distance_meters
+    point = func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326)
+    result = await db.execute(
+        select(Place).filter(
+            func.ST_DWithin(
+                func.ST_Transform(Place.geometry, 3857),
+                func.ST_Transform(point, 3857),
+                distance_meters
+            )
         )
-    ).all()
-    return places 
\ No newline at end of file
+    )
+    return list(result.scalars().all())
+
+
+async def get_place_features(
+    db: AsyncSession,
+    *,
+    user_id: int,
+    after_id: Optional[int] = None,
+    limit: int = 1000,
+    precision: int = DEFAULT_PRECISION,
+    simplify: float = 0.0
+) -> Tuple[List[str], Optional[int]]:
+    """
+    Obtener una página de lugares del usuario como Features GeoJSON generadas
+    por PostGIS, ordenadas por ID (paginación por clave: after_id es el último
+    ID de la página anterior). Devuelve las Features y el after_id de la
+    página siguiente, None si es la última.
+    """
+    feature = feature_expression(
+        Place.id,
+        Place.geometry,
+        {
+            "name": Place.name,
+            "description": Place.description,
+            "user_id": Place.user_id,
+            "created_at": Place.created_at,
+            "updated_at": Place.updated_at,
+        },
+        precision=precision,
+        simplify=simplify
+    )
+    query = select(Place.id, feature).filter(Place.user_id == user_id)
+    if after_id is not None:
+        query = query.filter(Place.id > after_id)
+    result = await db.execute(query.order_by(Place.id).limit(limit))
+    rows = result.all()
+    next_after_id = rows[-1].id if len(rows) == limit else None
+    return [row.feature for row in rows], next_after_id
\ No newline at end of file
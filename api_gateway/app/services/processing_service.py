@@ -1,11 +1,17 @@
-from typing import List, Optional
+import time
+from typing import Any, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 from datetime import datetime
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from geoalchemy2.shape import from_shape
-from shapely.geometry import shape
+from sqlalchemy import select, insert, update, func, cast, literal, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from geoalchemy2 import Geography
+from geoalchemy2.shape import from_shape, to_shape
+from shapely.geometry import shape, MultiPolygon
+from shapely.geometry.base import BaseGeometry
+from shapely import wkb
 from app.models.models import ProcessingBatch, DeforestationEvent
 from app.schemas.schemas import ProcessingBatchCreate, DeforestationEventCreate
+from app.services.geojson import DEFAULT_PRECISION, feature_expression
+from app.services import statistics_service
 
 # Constants for status
 PENDING = "pending"
@@ -13,13 +19,134 @@ PROCESSING = "processing"
 COMPLETED = "completed"
 FAILED = "failed"
 
-def create_processing_batch(
-    db: Session,
+# Parts of an area smaller than this fraction of it are slivers left by the
+# geometry operations, they are neither reused nor processed
+MIN_AREA_FRACTION = 0.001
+
+class ReusePlan(NamedTuple):
+    """
+    Result of the reuse planning of a batch: the events of each source batch
+    to copy, clipped to its region, and the area left to process
+    """
+    regions: List[Tuple[int, MultiPolygon]]
+    pending_area: MultiPolygon
+    coverage: float
+
+def _to_multipolygon(geometry) -> MultiPolygon:
+    # Keep the polygonal parts of the result of a geometry operation
+    if geometry.is_empty:
+        return MultiPolygon()
+    if geometry.geom_type == "Polygon":
+        return MultiPolygon([geometry])
+    if geometry.geom_type == "MultiPolygon":
+        return geometry
+    polygons = []
+    for part in getattr(geometry, "geoms", []):
+        polygons += list(_to_multipolygon(part).geoms)
+    return MultiPolygon(polygons)
+
+async def plan_batch_reuse(
+    db: AsyncSession,
+    *,
+    geometry: dict,
+    start_date: datetime,
+    end_date: datetime
+) -> ReusePlan:
+    """
+    Find the completed batches whose results can be reused for an area and
+    period: their period must contain the requested one and their area
+    intersect the requested one. Each part of the area is taken from the
+    most recently completed batch covering it.
+    """
+    area = shape(geometry)
+    result = await db.execute(
+        select(ProcessingBatch.id, ProcessingBatch.area_of_interest)
+        .filter(
+            ProcessingBatch.status == COMPLETED,
+            ProcessingBatch.start_date <= start_date,
+            ProcessingBatch.end_date >= end_date,
+            func.ST_Intersects(ProcessingBatch.area_of_interest, from_shape(area, srid=4326))
+        )
+        .order_by(ProcessingBatch.completed_at.desc().nullslast())
+    )
+
+    min_area = area.area * MIN_AREA_FRACTION
+    regions = []
+    covered = MultiPolygon()
+    for batch_id, batch_area in result.all():
+        region = _to_multipolygon(to_shape(batch_area).intersection(area).difference(covered))
+        if region.area <= min_area:
+            continue
+        regions.append((batch_id, region))
+        covered = _to_multipolygon(covered.union(region))
+
+    pending_area = _to_multipolygon(area.difference(covered))
+    if pending_area.area <= min_area:
+        pending_area = MultiPolygon()
+    coverage = 1.0 - pending_area.area / area.area if area.area > 0 else 0.0
+    return ReusePlan(regions=regions, pending_area=pending_area, coverage=coverage)
+
+async def copy_batch_events(
+    db: AsyncSession,
+    *,
+    source_batch_id: int,
+    target_batch_id: int,
+    region: MultiPolygon,
+    start_date: datetime,
+    end_date: datetime
+) -> int:
+    """
+    Copy the events of a batch detected in a period into another batch,
+    clipped to a region, in a single INSERT ... SELECT. The area of the
+    clipped events is recomputed. Return the number of events created.
+    """
+    region = from_shape(region, srid=4326)
+    clipped = func.ST_CollectionExtract(
+        func.ST_Intersection(DeforestationEvent.affected_area, region), 3
+    )
+    # The clipped events can be split, one event per polygon
+    parts = (
+        select(
+            func.ST_Dump(clipped).scalar_table_valued("geom").label("geom"),
+            DeforestationEvent.detected_at,
+            DeforestationEvent.confidence_score
+        )
+        .filter(
+            DeforestationEvent.batch_id == source_batch_id,
+            DeforestationEvent.detected_at >= start_date,
+            DeforestationEvent.detected_at <= end_date,
+            func.ST_Intersects(DeforestationEvent.affected_area, region)
+        )
+        .subquery()
+    )
+    area_hectares = func.ST_Area(cast(parts.c.geom, Geography(srid=4326))) / 10000.0
+    result = await db.execute(
+        insert(DeforestationEvent).from_select(
+            ["affected_area", "detected_at", "confidence_score", "area_hectares", "batch_id"],
+            select(
+                parts.c.geom,
+                parts.c.detected_at,
+                parts.c.confidence_score,
+                area_hectares,
+                literal(target_batch_id)
+            ).filter(area_hectares > 0)
+        )
+    )
+    return result.rowcount
+
+async def create_processing_batch(
+    db: AsyncSession,
     *,
     batch_in: ProcessingBatchCreate,
-    user_id: int
+    user_id: int,
+    reuse: bool = True
 ) -> ProcessingBatch:
-    """Create a new processing batch"""
+    """
+    Create a new processing batch. With reuse, the events of the completed
+    batches covering the area and period are copied into it (cf
+    plan_batch_reuse) and only the rest of the area is left to process, in
+    pending_area. A fully covered batch is completed at once.
+    """
     geometry = from_shape(shape(batch_in.area_of_interest), srid=4326)
     db_batch = ProcessingBatch(
         area_of_interest=geometry,
@@ -29,37 +156,68 @@ def create_processing_batch(
         user_id=user_id,
         status=PENDING
     )
+    plan = None
+    if reuse:
+        plan = await plan_batch_reuse(
+            db,
+            geometry=batch_in.area_of_interest,
+            start_date=batch_in.start_date,
+            end_date=batch_in.end_date
+        )
+    if plan is not None and plan.regions:
+        if plan.pending_area.is_empty:
+            db_batch.status = COMPLETED
+            db_batch.completed_at = datetime.utcnow()
+        else:
+            db_batch.pending_area = from_shape(plan.pending_area, srid=4326)
     db.add(db_batch)
-    db.commit()
-    db.refresh(db_batch)
+
+    if plan is not None and plan.regions:
+        # The batch id is needed for the events, everything is committed at once
+        await db.flush()
+        for source_batch_id, region in plan.regions:
+            await copy_batch_events(
+                db,
+                source_batch_id=source_batch_id,
+                target_batch_id=db_batch.id,
+                region=region,
+                start_date=batch_in.start_date,
+                end_date=batch_in.end_date
+            )
+        await statistics_service.refresh_batch_statistics(db, batch_id=db_batch.id)
+    await db.commit()
+    await db.refresh(db_batch)
     return db_batch
 
-def get_processing_batch(db: Session, batch_id: int) -> Optional[ProcessingBatch]:
+async def get_processing_batch(db: AsyncSession, batch_id: int) -> Optional[ProcessingBatch]:
     """Get a processing batch by ID"""
-    return db.query(ProcessingBatch).filter(ProcessingBatch.id == batch_id).first()
+    result = await db.execute(select(ProcessingBatch).filter(ProcessingBatch.id == batch_id))
+    return result.scalars().first()
 
-def get_user_processing_batches(
-    db: Session,
+async def get_user_processing_batches(
+    db: AsyncSession,
     user_id: int,
     skip: int = 0,
     limit: int = 100
 ) -> List[ProcessingBatch]:
     """Get all processing batches for a user"""
-    return db.query(ProcessingBatch)\
-        .filter(ProcessingBatch.user_id == user_id)\
-        .offset(skip)\
-        .limit(limit)\
-        .all()
-
-def update_batch_status(
-    db: Session,
+    result = await db.execute(
+        select(ProcessingBatch)
+        .filter(ProcessingBatch.user_id == user_id)
+        .offset(skip)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+async def update_batch_status(
+    db: AsyncSession,
     *,
     batch_id: int,
     status: str,
     error_message: Optional[str] = None
 ) -> ProcessingBatch:
     """Update the status of a processing batch"""
-    batch = get_processing_batch(db, batch_id)
+    batch = await get_processing_batch(db, batch_id)
     if not batch:
         return None
     
@@ -70,12 +228,12 @@ def update_batch_status(
         batch.error_message = error_message
     
     db.add(batch)
-    db.commit()
-    db.refresh(batch)
+    await db.commit()
+    await db.refresh(batch)
     return batch
 
-def create_deforestation_event(
-    db: Session,
+async def create_deforestation_event(
+    db: AsyncSession,
     *,
     event_in: DeforestationEventCreate
 ) -> DeforestationEvent:
@@ -89,52 +247,234 @@ def create_deforestation_event(
         batch_id=event_in.batch_id
     )
     db.add(db_event)
-    db.commit()
-    db.refresh(db_event)
+    await statistics_service.add_event_statistics(
+        db,
+        batch_id=event_in.batch_id,
+        events=[(event_in.confidence_score, event_in.area_hectares)]
+    )
+    await db.commit()
+    await db.refresh(db_event)
     return db_event
 
-def get_batch_events(
-    db: Session,
+# Staging table of the bulk ingestion, geometries are sent as WKB
+STAGING_TABLE = "deforestation_events_staging"
+STAGING_COLUMNS = ["wkb", "detected_at", "confidence_score", "area_hectares"]
+
+def _iter_event_records(events: Any) -> Iterator[Tuple[bytes, datetime, float, Optional[float]]]:
+    """
+    Convert events to staging records (WKB, detected_at, confidence_score,
+    area_hectares). events is a GeoDataFrame with the columns detected_at,
+    confidence_score and optionally area_hectares, or an iterable of
+    dictionaries (or DeforestationEventCreate) with the same keys and the
+    geometry in affected_area (GeoJSON, shapely geometry or WKB). Multi
+    polygons are split, the area of their parts is computed by PostGIS, as
+    are the missing areas and the areas not above 0. Raise ValueError for a
+    confidence_score outside [0, 1], as DeforestationEventCreate does.
+    """
+    if hasattr(events, "geometry") and hasattr(events, "itertuples"):
+        if events.crs is not None and events.crs.to_epsg() != 4326:
+            events = events.to_crs(epsg=4326)
+        areas = events["area_hectares"] if "area_hectares" in events.columns else [None] * len(events)
+        rows = (
+            {
+                "affected_area": geometry,
+                "detected_at": detected_at,
+                "confidence_score": confidence_score,
+                "area_hectares": area_hectares,
+            }
+            for geometry, detected_at, confidence_score, area_hectares in zip(
+                events.geometry, events["detected_at"], events["confidence_score"], areas
+            )
+        )
+    else:
+        rows = (event if isinstance(event, dict) else event.model_dump() for event in events)
+
+    for row in rows:
+        geometry = row["affected_area"]
+        confidence_score = float(row["confidence_score"])
+        if not 0 <= confidence_score <= 1:
+            raise ValueError(f"confidence_score must be between 0 and 1, got {confidence_score}")
+        area_hectares = row.get("area_hectares")
+        # Missing areas of a GeoDataFrame are NaN
+        if area_hectares is not None and area_hectares == area_hectares and area_hectares > 0:
+            area_hectares = float(area_hectares)
+        else:
+            area_hectares = None
+        if isinstance(geometry, (bytes, memoryview)):
+            geometry = wkb.loads(bytes(geometry))
+        elif not isinstance(geometry, BaseGeometry):
+            geometry = shape(geometry)
+        polygons = _to_multipolygon(geometry).geoms
+        if len(polygons) > 1:
+            area_hectares = None
+        for polygon in polygons:
+            yield polygon.wkb, row["detected_at"], confidence_score, area_hectares
+
+async def ingest_deforestation_events(
+    db: AsyncSession,
+    *,
+    batch_id: int,
+    events: Iterable[Any],
+    method: str = "copy",
+    chunk_size: int = 10000,
+    status: str = COMPLETED
+) -> dict:
+    """
+    Store the events of a batch in bulk, in a single transaction which also
+    updates the statistics and the status of the batch: either all the
+    events are stored and the batch gets the new status, or nothing changes.
+    On failure the batch is marked as failed.
+    events: cf _iter_event_records, consumed as a stream
+    method: "copy" sends the events with COPY (binary), "executemany" with
+    batched INSERTs of chunk_size events
+    status: status of the batch once the events are stored
+    Return the number of events stored, the duration in seconds and the
+    number of events per second.
+    """
+    if method not in ("copy", "executemany"):
+        raise ValueError(f"Unknown ingestion method {method}")
+    start = time.perf_counter()
+    try:
+        # Lock the batch, concurrent ingestions of the same batch wait. This
+        # first statement also opens the transaction used below.
+        result = await db.execute(
+            select(ProcessingBatch.id).filter(ProcessingBatch.id == batch_id).with_for_update()
+        )
+        if result.first() is None:
+            raise ValueError(f"Batch {batch_id} not found")
+
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+
+        # The events go through a temporary table so that PostGIS decodes
+        # the WKB and computes the missing areas in one INSERT ... SELECT
+        await db.execute(text(f"""
+            CREATE TEMPORARY TABLE {STAGING_TABLE} (
+                wkb bytea NOT NULL,
+                detected_at timestamptz NOT NULL,
+                confidence_score double precision NOT NULL,
+                area_hectares double precision
+            ) ON COMMIT DROP
+        """))
+        records = _iter_event_records(events)
+        if method == "copy":
+            await driver_connection.copy_records_to_table(
+                STAGING_TABLE, records=records, columns=STAGING_COLUMNS
+            )
+        else:
+            chunk = []
+            for record in records:
+                chunk.append(record)
+                if len(chunk) >= chunk_size:
+                    await driver_connection.executemany(
+                        f"INSERT INTO {STAGING_TABLE} VALUES ($1, $2, $3, $4)", chunk
+                    )
+                    chunk = []
+            if chunk:
+                await driver_connection.executemany(
+                    f"INSERT INTO {STAGING_TABLE} VALUES ($1, $2, $3, $4)", chunk
+                )
+
+        result = await db.execute(
+            text(f"""
+                INSERT INTO deforestation_events
+                    (affected_area, detected_at, confidence_score, area_hectares, batch_id)
+                SELECT geom, detected_at, confidence_score,
+                       COALESCE(area_hectares, ST_Area(geom::geography) / 10000.0),
+                       CAST(:batch_id AS INTEGER)
+                FROM (
+                    SELECT ST_GeomFromWKB(wkb, 4326) AS geom, detected_at, confidence_score, area_hectares
+                    FROM {STAGING_TABLE}
+                ) AS staging
+            """),
+            {"batch_id": batch_id}
+        )
+        nb_events = result.rowcount
+
+        await statistics_service.refresh_batch_statistics(db, batch_id=batch_id)
+        values = {"status": status}
+        if status == COMPLETED:
+            # Nothing is left to process once the events are stored
+            values["completed_at"] = datetime.utcnow()
+            values["pending_area"] = None
+        await db.execute(
+            update(ProcessingBatch).filter(ProcessingBatch.id == batch_id).values(**values)
+        )
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        await update_batch_status(db, batch_id=batch_id, status=FAILED, error_message=f"Event ingestion failed: {e}")
+        raise
+
+    duration = time.perf_counter() - start
+    return {
+        "batch_id": batch_id,
+        "nb_events": nb_events,
+        "duration": duration,
+        "events_per_second": nb_events / duration if duration > 0 else 0.0,
+    }
+
+async def get_batch_events(
+    db: AsyncSession,
     batch_id: int,
     min_confidence: float = 0.0
 ) -> List[DeforestationEvent]:
     """Get all deforestation events for a batch"""
-    return db.query(DeforestationEvent)\
+    result = await db.execute(
+        select(DeforestationEvent)
         .filter(
             DeforestationEvent.batch_id == batch_id,
             DeforestationEvent.confidence_score >= min_confidence
-        )\
-        .all()
+        )
+    )
+    return list(result.scalars().all())
 
-def check_area_processed(
-    db: Session,
+async def get_batch_event_features(
+    db: AsyncSession,
     *,
-    geometry: dict,
-    start_date: datetime,
-    end_date: datetime
-) -> bool:
-    """Check if an area has been processed for a given time period"""
-    area = from_shape(shape(geometry), srid=4326)
-    existing_batch = db.query(ProcessingBatch)\
-        .filter(
-            func.ST_Intersects(ProcessingBatch.area_of_interest, area),
-            ProcessingBatch.start_date == start_date,
-            ProcessingBatch.end_date == end_date,
-            ProcessingBatch.status == COMPLETED
-        )\
-        .first()
-    return existing_batch is not None
-
-def get_total_deforestation_area(
-    db: Session,
+    batch_id: int,
+    min_confidence: float = 0.0,
+    after_id: Optional[int] = None,
+    limit: int = 1000,
+    precision: int = DEFAULT_PRECISION,
+    simplify: float = 0.0
+) -> Tuple[List[str], Optional[int]]:
+    """
+    Get a page of the deforestation events of a batch as GeoJSON Features
+    built by PostGIS, ordered by ID (keyset pagination, after_id is the last
+    ID of the previous page). Return the Features and the after_id of the
+    next page, None for the last page.
+    """
+    feature = feature_expression(
+        DeforestationEvent.id,
+        DeforestationEvent.affected_area,
+        {
+            "batch_id": DeforestationEvent.batch_id,
+            "detected_at": DeforestationEvent.detected_at,
+            "confidence_score": DeforestationEvent.confidence_score,
+            "area_hectares": DeforestationEvent.area_hectares,
+        },
+        precision=precision,
+        simplify=simplify
+    )
+    query = select(DeforestationEvent.id, feature).filter(
+        DeforestationEvent.batch_id == batch_id,
+        DeforestationEvent.confidence_score >= min_confidence
+    )
+    if after_id is not None:
+        query = query.filter(DeforestationEvent.id > after_id)
+    result = await db.execute(query.order_by(DeforestationEvent.id).limit(limit))
+    rows = result.all()
+    next_after_id = rows[-1].id if len(rows) == limit else None
+    return [row.feature for row in rows], next_after_id
+
+async def get_total_deforestation_area(
+    db: AsyncSession,
     batch_id: int,
     min_confidence: float = 0.7
 ) -> float:
-    """Get total deforested area for a batch"""
-    result = db.query(func.sum(DeforestationEvent.area_hectares))\
-        .filter(
-            DeforestationEvent.batch_id == batch_id,
-            DeforestationEvent.confidence_score >= min_confidence
-        )\
-        .scalar()
-    return result or 0.0 
\ No newline at end of file
+    """Get total deforested area for a batch (cf statistics_service)"""
+    return await statistics_service.get_total_area(
+        db, batch_id=batch_id, min_confidence=min_confidence
+    )
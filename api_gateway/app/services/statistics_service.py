@@ -0,0 +1,148 @@
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import BatchConfidenceStats, DeforestationEvent
+
+# The statistics are kept per confidence bucket of 0.01, so that the totals
+# above any confidence with 2 decimals are exact
+NB_BUCKETS = 100
+# Tolerance on the float representation of the scores (eg. 0.29 * 100 is
+# 28.999999999999996)
+EPSILON = 1e-9
+
+def get_bucket(confidence_score: float) -> int:
+    """Confidence bucket of a score, scores out of [0, 1] go to the first or last bucket"""
+    return max(min(int(math.floor(confidence_score * NB_BUCKETS + EPSILON)), NB_BUCKETS - 1), 0)
+
+def get_threshold_bucket(min_confidence: float) -> Optional[int]:
+    """
+    First bucket of the scores above min_confidence, None if min_confidence
+    is not on a bucket boundary (or is 1, the last bucket includes 1)
+    """
+    position = min_confidence * NB_BUCKETS
+    if abs(position - round(position)) > EPSILON or round(position) >= NB_BUCKETS:
+        return None
+    return int(round(position))
+
+def _bucket_expression(confidence_score):
+    return func.greatest(func.least(func.floor(confidence_score * NB_BUCKETS + EPSILON), NB_BUCKETS - 1), 0)
+
+async def add_event_statistics(
+    db: AsyncSession,
+    *,
+    batch_id: int,
+    events: Iterable[Tuple[float, float]]
+) -> None:
+    """
+    Add new events, as (confidence_score, area_hectares), to the statistics
+    of a batch. Must run in the transaction inserting the events.
+    """
+    buckets: Dict[int, List[float]] = {}
+    for confidence_score, area_hectares in events:
+        bucket = buckets.setdefault(get_bucket(confidence_score), [0, 0.0])
+        bucket[0] += 1
+        bucket[1] += area_hectares
+    if not buckets:
+        return
+
+    stmt = insert(BatchConfidenceStats).values([
+        {"batch_id": batch_id, "bucket": bucket, "event_count": count, "area_hectares": area}
+        for bucket, (count, area) in sorted(buckets.items())
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[BatchConfidenceStats.batch_id, BatchConfidenceStats.bucket],
+        set_={
+            "event_count": BatchConfidenceStats.event_count + stmt.excluded.event_count,
+            "area_hectares": BatchConfidenceStats.area_hectares + stmt.excluded.area_hectares,
+        }
+    )
+    await db.execute(stmt)
+
+async def refresh_batch_statistics(db: AsyncSession, *, batch_id: int) -> None:
+    """
+    Recompute the statistics of a batch from its events, for the events
+    inserted by the database itself (eg. INSERT ... SELECT)
+    """
+    await db.execute(delete(BatchConfidenceStats).filter(BatchConfidenceStats.batch_id == batch_id))
+    bucket = _bucket_expression(DeforestationEvent.confidence_score)
+    await db.execute(
+        insert(BatchConfidenceStats).from_select(
+            ["batch_id", "bucket", "event_count", "area_hectares"],
+            select(
+                DeforestationEvent.batch_id,
+                bucket,
+                func.count(),
+                func.sum(DeforestationEvent.area_hectares)
+            )
+            .filter(DeforestationEvent.batch_id == batch_id)
+            .group_by(DeforestationEvent.batch_id, bucket)
+        )
+    )
+
+async def get_batch_buckets(db: AsyncSession, *, batch_id: int) -> List[BatchConfidenceStats]:
+    """Statistics of a batch per confidence bucket (at most NB_BUCKETS rows)"""
+    result = await db.execute(
+        select(BatchConfidenceStats)
+        .filter(BatchConfidenceStats.batch_id == batch_id)
+        .order_by(BatchConfidenceStats.bucket)
+    )
+    return list(result.scalars().all())
+
+async def get_total_area(db: AsyncSession, *, batch_id: int, min_confidence: float = 0.7) -> float:
+    """
+    Total area of the events of a batch above a confidence, from the
+    statistics when min_confidence is on a bucket boundary, from the events
+    otherwise
+    """
+    threshold = get_threshold_bucket(min_confidence)
+    if threshold is None:
+        result = await db.execute(
+            select(func.sum(DeforestationEvent.area_hectares))
+            .filter(
+                DeforestationEvent.batch_id == batch_id,
+                DeforestationEvent.confidence_score >= min_confidence
+            )
+        )
+        return result.scalar() or 0.0
+    result = await db.execute(
+        select(func.sum(BatchConfidenceStats.area_hectares))
+        .filter(
+            BatchConfidenceStats.batch_id == batch_id,
+            BatchConfidenceStats.bucket >= threshold
+        )
+    )
+    return result.scalar() or 0.0
+
+async def get_batch_statistics(db: AsyncSession, *, batch_id: int) -> dict:
+    """Number of events and total area of a batch"""
+    buckets = await get_batch_buckets(db, batch_id=batch_id)
+    return {
+        "batch_id": batch_id,
+        "event_count": sum(bucket.event_count for bucket in buckets),
+        "total_area_hectares": sum(bucket.area_hectares for bucket in buckets),
+    }
+
+async def get_confidence_histogram(db: AsyncSession, *, batch_id: int, bins: int = 10) -> List[dict]:
+    """
+    Number of events and area of a batch per confidence bin, bins must
+    divide NB_BUCKETS
+    """
+    if NB_BUCKETS % bins != 0:
+        raise ValueError(f"bins must divide {NB_BUCKETS}")
+    width = NB_BUCKETS // bins
+    histogram = [
+        {
+            "min_confidence": i * width / NB_BUCKETS,
+            "max_confidence": (i + 1) * width / NB_BUCKETS,
+            "event_count": 0,
+            "area_hectares": 0.0,
+        }
+        for i in range(bins)
+    ]
+    for bucket in await get_batch_buckets(db, batch_id=batch_id):
+        histogram_bin = histogram[bucket.bucket // width]
+        histogram_bin["event_count"] += bucket.event_count
+        histogram_bin["area_hectares"] += bucket.area_hectares
+    return histogram
\ No newline at end of file
@@ -0,0 +1,94 @@
+from typing import Optional
+from sqlalchemy import select, func, cast, String
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.models import Place, ProcessingBatch, DeforestationEvent
+
+# Layers served as vector tiles
+PLACES = "places"
+EVENTS = "events"
+LAYERS = (PLACES, EVENTS)
+
+# Tile coordinates resolution and clipping buffer, in tile units
+EXTENT = 4096
+BUFFER = 64
+
+# Geometries are simplified to half a pixel of a 256px tile at the requested
+# zoom, finer details are not visible anyway
+WEB_MERCATOR_WIDTH = 40075016.685578488
+SIMPLIFY_PIXELS = 0.5
+MAX_ZOOM = 22
+
+def get_simplify_tolerance(z: int) -> float:
+    """Simplification tolerance in meters (EPSG:3857) at a zoom level"""
+    return WEB_MERCATOR_WIDTH / (2 ** z) / 256 * SIMPLIFY_PIXELS
+
+def _tile_geometry(geometry, bounds, z: int):
+    # Reproject, simplify, then clip and quantize to the tile grid
+    simplified = func.ST_Simplify(
+        func.ST_Transform(geometry, 3857), get_simplify_tolerance(z), True
+    )
+    return func.ST_AsMVTGeom(simplified, bounds, EXTENT, BUFFER, True).label("geom")
+
+async def get_tile(
+    db: AsyncSession,
+    *,
+    layer: str,
+    z: int,
+    x: int,
+    y: int,
+    user_id: int,
+    batch_id: Optional[int] = None,
+    min_confidence: float = 0.0
+) -> bytes:
+    """
+    Build a Mapbox Vector Tile of a layer with PostGIS, only the features
+    owned by the user are included
+    """
+    bounds = func.ST_TileEnvelope(z, x, y)
+    # Bounding box test in the storage SRID, so the GiST index is used
+    bounds_4326 = func.ST_Transform(bounds, 4326)
+
+    if layer == PLACES:
+        rows = (
+            select(
+                Place.id,
+                Place.name,
+                _tile_geometry(Place.geometry, bounds, z)
+            )
+            .filter(
+                Place.user_id == user_id,
+                Place.geometry.op("&&")(bounds_4326)
+            )
+        )
+    elif layer == EVENTS:
+        rows = (
+            select(
+                DeforestationEvent.id,
+                DeforestationEvent.batch_id,
+                DeforestationEvent.confidence_score,
+                DeforestationEvent.area_hectares,
+                cast(DeforestationEvent.detected_at, String).label("detected_at"),
+                _tile_geometry(DeforestationEvent.affected_area, bounds, z)
+            )
+            .join(ProcessingBatch, ProcessingBatch.id == DeforestationEvent.batch_id)
+            .filter(
+                ProcessingBatch.user_id == user_id,
+                DeforestationEvent.confidence_score >= min_confidence,
+                DeforestationEvent.affected_area.op("&&")(bounds_4326)
+            )
+        )
+        if batch_id is not None:
+            rows = rows.filter(DeforestationEvent.batch_id == batch_id)
+    else:
+        raise ValueError(f"Unknown layer {layer}")
+
+    rows = rows.subquery("tile_rows")
+    # ST_AsMVTGeom returns NULL for the geometries outside the tile once
+    # clipped, they are not encoded
+    tile = (
+        select(func.ST_AsMVT(rows.table_valued(), layer, EXTENT, "geom", "id"))
+        .select_from(rows)
+        .filter(rows.c.geom.isnot(None))
+    )
+    result = await db.execute(tile)
+    return result.scalar() or b""
\ No newline at end of file
@@ -1,30 +1,58 @@
 from typing import Optional
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from app.models.models import User
-from app.schemas.schemas import UserCreate
+from app.schemas.schemas import UserCreate, UserUpdate
 from app.core.security import get_password_hash, verify_password
+from app.core.user_cache import user_cache
 
-def get_user_by_email(db: Session, email: str) -> Optional[User]:
-    return db.query(User).filter(User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    result = await db.execute(select(User).filter(User.email == email))
+    return result.scalars().first()
 
-def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
-    return db.query(User).filter(User.id == user_id).first()
+async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
+    return await db.get(User, user_id)
 
-def create_user(db: Session, user_in: UserCreate) -> User:
+async def create_user(db: AsyncSession, user_in: UserCreate) -> User:
+    # bcrypt is CPU bound, keep it off the event loop
+    hashed_password = await run_in_threadpool(get_password_hash, user_in.password)
     db_user = User(
         email=user_in.email,
-        hashed_password=get_password_hash(user_in.password),
+        hashed_password=hashed_password,
         full_name=user_in.full_name,
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def authenticate(db: Session, email: str, password: str) -> Optional[User]:
-    user = get_user_by_email(db=db, email=email)
+async def update_user(db: AsyncSession, *, db_user: User, user_in: UserUpdate) -> User:
+    update_data = user_in.model_dump(exclude_unset=True)
+    password = update_data.pop("password", None)
+    if password is not None:
+        update_data["hashed_password"] = await run_in_threadpool(get_password_hash, password)
+    for field, value in update_data.items():
+        setattr(db_user, field, value)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    # Authenticated requests must not keep seeing the previous version
+    await user_cache.invalidate(db_user.id)
+    return db_user
+
+async def deactivate_user(db: AsyncSession, *, db_user: User) -> User:
+    db_user.is_active = False
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    await user_cache.invalidate(db_user.id)
+    return db_user
+
+async def authenticate(db: AsyncSession, email: str, password: str) -> Optional[User]:
+    user = await get_user_by_email(db=db, email=email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await run_in_threadpool(verify_password, password, user.hashed_password):
         return None
-    return user 
\ No newline at end of file
+    return user
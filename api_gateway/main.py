@@ -4,7 +4,7 @@ from typing import Dict, List
 from celery.result import AsyncResult
 from pydantic import BaseModel, Field
 from datetime import date
-from rate_limit.rate_limiter import RateLimitFactory
+from rate_limit.middleware import RateLimitMiddleware, RoutePolicy
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.api import api_router
 from app.core.config import settings
@@ -43,7 +43,43 @@ app = FastAPI(
     openapi_url=f"{settings.API_V1_STR}/openapi.json"
 )
 
-# Set all CORS enabled origins
+"""
+Rate limits are applied by RateLimitMiddleware, per client IP address, according to the route policies below.
+Each request consumes the cost of the first policy matching it from the bucket of that policy.
+Processing submissions (Google Earth Engine and the change detection networks) have their own bucket,
+so they can't starve the cheap reads of the map.
+The limits are shared by all the processes when RATE_LIMIT_REDIS_URL is set, and per process otherwise.
+"""
+RATE_LIMIT_BUCKETS = {
+    # Demo bucket of the /limited route: 10 tokens, 1 token per second
+    "limited": {"algorithm": "TokenBucket"},
+    # Reads and cheap writes: bursts of 120 tokens, 2 tokens per second
+    "default": {"algorithm": "TokenBucket", "total_capacity": 120, "tokens_per_interval": 2},
+    # Map tiles: a pan or zoom loads dozens of tiles at once, bursts of 300 tiles, 20 tiles per second
+    "tiles": {"algorithm": "TokenBucket", "total_capacity": 300, "tokens_per_interval": 20},
+    # Processing submissions: bursts of 2 submissions, 1 more every 30 minutes
+    "processing": {"algorithm": "TokenBucket", "total_capacity": 100, "tokens_per_interval": 50, "token_interval": 1800},
+}
+API = settings.API_V1_STR
+RATE_LIMIT_POLICIES = [
+    RoutePolicy("GET", r"/limited", cost=1, bucket="limited"),
+    RoutePolicy("GET", r"/unlimited|/health", cost=0),
+    RoutePolicy("POST", r"/process", cost=50, bucket="processing"),
+    RoutePolicy("POST", rf"{API}/processing/batch/", cost=50, bucket="processing"),
+    RoutePolicy("POST", rf"{API}/auth/(login|signup)", cost=10),
+    RoutePolicy("GET", rf"{API}/places/nearby/", cost=5),
+    RoutePolicy("GET", rf"{API}/places/bbox/", cost=1),
+    RoutePolicy("GET", rf"{API}/tiles/.*", cost=1, bucket="tiles"),
+    RoutePolicy("*", r".*", cost=1),
+]
+app.add_middleware(
+    RateLimitMiddleware,
+    policies=RATE_LIMIT_POLICIES,
+    buckets=RATE_LIMIT_BUCKETS,
+    redis_url=settings.RATE_LIMIT_REDIS_URL,
+)
+
+# Set all CORS enabled origins (added last so that it also wraps the rate limit responses)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all origins during development
@@ -52,29 +88,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-"""
-We are tracking API limit from every IP address and 
-This way we can handle traffic from each end user independently.
-"""
-ip_addresses = {}
-
 """
 We have two endpoints in the API, one is limited and the other is unlimited.
 
-The limited endpoint is rate-limited using the TokenBucket algorithm 
-which can be changed to any other algorithm by passing the algorithm name 
-as a parameter to the get_instance method of the RateLimitFactory class.
+The limited endpoint is rate-limited by the middleware using the TokenBucket algorithm 
+which can be changed to any other algorithm in the "limited" bucket of RATE_LIMIT_BUCKETS.
 """
 @app.get("/limited")
 def limited(request: Request):
-    client = request.client.host
-    try:
-        if client not in ip_addresses:
-            ip_addresses[client] = RateLimitFactory.get_instance("TokenBucket")
-        if ip_addresses[client].allow_request():
-            return "This is a limited use API"
-    except RateLimitExceeded as e:
-        raise e
+    return "This is a limited use API"
 
 """
 The unlimited endpoint is not rate-limited and can be accessed without any restrictions.
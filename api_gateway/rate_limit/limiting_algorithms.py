@@ -1,18 +1,29 @@
+from collections import deque
 from datetime import datetime
+import math
 import threading
 from fastapi import HTTPException
 
 # Implement the RateLimit class, which is used to define the rate limit configuration.
 class RateLimit:
-    def __init__(self):
-        self.interval = 60
-        self.limit_per_interval = 60
+    def __init__(self, interval=60, limit_per_interval=60):
+        self.interval = interval
+        self.limit_per_interval = limit_per_interval
         self.lock = threading.Lock()
 
+    # Highest cost a single request can have, requests costing more are never allowed.
+    def get_max_cost(self):
+        return self.limit_per_interval
+
 # Implement the RateLimitExceeded class, which inherits from the HTTPException class.
+# retry_after is the number of seconds before the request can succeed, sent in the Retry-After header.
 class RateLimitExceeded(HTTPException):
-    def __init__(self, detail="Rate limit exceeded"):
-        super().__init__(status_code=429, detail=detail)
+    def __init__(self, detail="Rate limit exceeded", retry_after=None):
+        headers = None
+        if retry_after is not None:
+            headers = {"Retry-After": str(max(1, math.ceil(retry_after)))}
+        super().__init__(status_code=429, detail=detail, headers=headers)
+        self.retry_after = retry_after
 
 # Implement the TokenBucket class, which inherits from the RateLimit class.
 class TokenBucket(RateLimit):
@@ -22,32 +33,37 @@ class TokenBucket(RateLimit):
     The initial value of self.tokens is 10. Each time an API call is made, this value is reduced.
     We capture the timestamp of the last API request made using self.last_updated.
     We are using threading.Lock() to ensure that the operations we perform are consistent and atomic.
+    A request can cost several tokens, so that expensive API calls consume more of the bucket.
     """
-    def __init__(self):
+    def __init__(self, total_capacity=10, token_interval=1, tokens_per_interval=1):
         super().__init__()
-        self.total_capacity = 10
-        self.token_interval = 1
-        self.tokens_per_interval = 1
-        # Initial value of self.tokens = 10. Each time an API call is made, this value is reduced.
-        self.tokens = 10
+        self.total_capacity = total_capacity
+        self.token_interval = token_interval
+        self.tokens_per_interval = tokens_per_interval
+        # Initial value of self.tokens = total_capacity. Each time an API call is made, this value is reduced.
+        self.tokens = total_capacity
         # Capture the timestamp of the last API request made. 
         self.last_updated = datetime.now()
         # We are using threading.Lock() to ensure that the operations we perform are consistent and atomic
         self.lock = threading.Lock()
 
-    def allow_request(self, ip):
+    def get_max_cost(self):
+        return self.total_capacity
+
+    def allow_request(self, ip, cost=1):
         with self.lock:
             # Calculate the time difference between the current time and the time when the last API call was executed.
             curr = datetime.now()
             gap = (curr - self.last_updated).total_seconds()
-            tokens_to_add =  gap*self.tokens_per_interval
+            rate = self.tokens_per_interval/self.token_interval
+            tokens_to_add =  gap*rate
             self.tokens = min(self.total_capacity,tokens_to_add+self.tokens)
             self.last_updated = curr
 
-            if self.tokens>=1:
-                self.tokens-=1
+            if self.tokens>=cost:
+                self.tokens-=cost
                 return True
-            raise RateLimitExceeded()
+            raise RateLimitExceeded(retry_after=(cost-self.tokens)/rate)
         
 # Implement the FixedCounterWindow class, which inherits from the RateLimit class.
 class FixedCounterWindow(RateLimit):
@@ -60,50 +76,56 @@ class FixedCounterWindow(RateLimit):
     If the count surpasses the set limit, we raise a RateLimitExceeded exception. H
     owever, when the minute concludes and the next minute begins, we reset our counter back to zero.
     """
-    def __init__(self):
-        super().__init__()
+    def __init__(self, limit_per_interval=60):
+        super().__init__(limit_per_interval=limit_per_interval)
         self.counter = 0
         # Employ a 60-second time window, which begins at the 0th second and 0th microsecond. 
         # When an API call is initiated, we record the current time and commence incrementing the counter. 
         self.curr_time = datetime.now().time().replace(second=0,microsecond=0)
     
-    def allow_request(self,ip):
+    def allow_request(self, ip, cost=1):
         with self.lock:
-            curr = datetime.now().time().replace(second=0,microsecond=0)
+            now = datetime.now()
+            curr = now.time().replace(second=0,microsecond=0)
             if curr!=self.curr_time:
                 self.curr_time = curr
                 self.counter = 0
             
-            if self.counter>=self.limit_per_interval:
-                raise RateLimitExceeded()
-            self.counter+=1
+            if self.counter+cost>self.limit_per_interval:
+                # Wait for the next minute
+                raise RateLimitExceeded(retry_after=60-now.second-now.microsecond/1e6)
+            self.counter+=cost
             return True
 
 # Implement the SlidingWindow class, which inherits from the RateLimit class.
 class SlidingWindow(RateLimit):
     """
-    Maintain a log list that captures timestamps for all successful API calls
+    Maintain a log deque that captures the timestamps and costs of all successful API calls
     When a new API call is made, the first step is to remove all log entries older than 60 seconds.
-    Once this cleanup is completed, we check the length of the log list. 
-    If it exceeds or equals our limit (e.g., 60 API calls per minute), we raise an exception; 
+    Once this cleanup is completed, we check the total cost of the log entries, kept up to date in self.total. 
+    If adding the cost of the call exceeds our limit (e.g., 60 API calls per minute), we raise an exception; 
     Otherwise, we add the current timestamp to the logs.   
+    Removing the oldest entries from a deque is O(1), unlike list.pop(0) which shifts the whole list.
     """
-    def __init__(self):
-        super().__init__()
-        # Maintain a log list that captures timestamps for all successful API calls
-        self.logs = []
-        self.limit_per_interval = 60
-        self.interval = 60
+    def __init__(self, limit_per_interval=60, interval=60):
+        super().__init__(interval=interval, limit_per_interval=limit_per_interval)
+        # Maintain a log deque that captures timestamps and costs for all successful API calls
+        self.logs = deque()
+        self.total = 0
     
-    def allow_request(self,ip):
-        while self.lock:
+    def allow_request(self, ip, cost=1):
+        with self.lock:
             curr = datetime.now()
-            while len(self.logs)>0 and (curr-self.logs[0]).total_seconds()>self.interval:
-                self.logs.pop(0)
+            while len(self.logs)>0 and (curr-self.logs[0][0]).total_seconds()>self.interval:
+                self.total -= self.logs.popleft()[1]
 
-            if len(self.logs)>=self.limit_per_interval:
-                raise RateLimitExceeded()
-                return
+            if self.total+cost>self.limit_per_interval:
+                # Wait for the oldest entry to leave the window
+                retry_after = self.interval
+                if len(self.logs)>0:
+                    retry_after -= (curr-self.logs[0][0]).total_seconds()
+                raise RateLimitExceeded(retry_after=retry_after)
             
-            self.logs.append(curr)
+            self.logs.append((curr, cost))
+            self.total += cost
             return True
\ No newline at end of file
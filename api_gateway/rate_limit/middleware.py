@@ -0,0 +1,108 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from fastapi.responses import JSONResponse
+from .limiting_algorithms import RateLimitExceeded
+from .rate_limiter import RateLimitFactory
+
+# Implement the RoutePolicy class, which defines what a request to a route costs and which bucket pays for it.
+class RoutePolicy:
+    """
+    method: the HTTP method, "*" matches all the methods
+    path: regular expression matching the whole request path
+    cost: number of tokens (or requests) consumed by one request
+    bucket: name of the limit the cost is taken from. Routes sharing a bucket share the same budget,
+    so expensive routes are put in their own bucket to keep them from exhausting the one of the cheap reads.
+    """
+    def __init__(self, method, path, cost=1, bucket="default"):
+        self.method = method.upper()
+        self.path = re.compile(path)
+        self.cost = cost
+        self.bucket = bucket
+
+    def matches(self, method, path):
+        return (self.method == "*" or self.method == method) and self.path.fullmatch(path) is not None
+
+# Implement the RateLimitMiddleware class, an ASGI middleware applying the route policies to every request.
+class RateLimitMiddleware:
+    """
+    The first policy matching the method and path of a request is applied, requests matching no policy
+    or a policy of cost 0 are not limited.
+    Each bucket is described by the arguments of RateLimitFactory.get_instance (eg. {"algorithm": "TokenBucket",
+    "total_capacity": 100}) and the limits apply per client IP address.
+    Without redis_url, one limiter is kept in memory per client and bucket, the least recently used ones are dropped
+    beyond max_clients so the memory stays bounded. With redis_url, one Redis limiter per bucket serves all the clients
+    and the limits are shared by all the processes.
+    Rejected requests get a 429 response with a Retry-After header. If Redis can't be reached the requests are let
+    through, the gateway must keep working without its limiter.
+    """
+    def __init__(self, app, policies, buckets, redis_url=None, max_clients=10000):
+        self.app = app
+        self.policies = policies
+        self.buckets = buckets
+        self.redis_url = redis_url
+        self.max_clients = max_clients
+        self.limiters = OrderedDict()
+        self.lock = threading.Lock()
+        if redis_url is not None:
+            from redis.exceptions import RedisError
+            self.redis_errors = RedisError
+            for name, bucket in buckets.items():
+                self.limiters[name] = RateLimitFactory.get_instance(redis_url=redis_url, **bucket)
+        # A policy costing more than its bucket holds would reject every request
+        for policy in policies:
+            if redis_url is not None:
+                limiter = self.limiters[policy.bucket]
+            else:
+                limiter = RateLimitFactory.get_instance(**buckets[policy.bucket])
+            if policy.cost > limiter.get_max_cost():
+                raise ValueError(f"cost of {policy.path.pattern} is higher than the capacity of bucket {policy.bucket}")
+
+    def get_policy(self, method, path):
+        for policy in self.policies:
+            if policy.matches(method, path):
+                return policy
+        return None
+
+    def get_limiter(self, client, bucket):
+        if self.redis_url is not None:
+            return self.limiters[bucket]
+        key = (client, bucket)
+        with self.lock:
+            limiter = self.limiters.get(key)
+            if limiter is None:
+                limiter = RateLimitFactory.get_instance(**self.buckets[bucket])
+                self.limiters[key] = limiter
+                if len(self.limiters) > self.max_clients:
+                    self.limiters.popitem(last=False)
+            else:
+                self.limiters.move_to_end(key)
+            return limiter
+
+    async def __call__(self, scope, receive, send):
+        # CORS preflight requests are not limited
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        policy = self.get_policy(scope["method"], scope["path"])
+        if policy is None or policy.cost == 0:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope["client"][0] if scope.get("client") else "unknown"
+        limiter = self.get_limiter(client, policy.bucket)
+        try:
+            if self.redis_url is not None:
+                await limiter.allow_request(client, policy.bucket, cost=policy.cost)
+            else:
+                limiter.allow_request(client, cost=policy.cost)
+        except RateLimitExceeded as e:
+            response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+            await response(scope, receive, send)
+            return
+        except Exception as e:
+            if self.redis_url is None or not isinstance(e, self.redis_errors):
+                raise
+            logging.warning(f"Rate limiter unavailable: {e}")
+        await self.app(scope, receive, send)
\ No newline at end of file
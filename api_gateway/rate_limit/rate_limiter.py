@@ -1,19 +1,35 @@
-from limiting_algorithms import FixedCounterWindow, TokenBucket, SlidingWindow
+from .limiting_algorithms import FixedCounterWindow, TokenBucket, SlidingWindow
+from .redis_algorithms import RedisFixedCounterWindow, RedisTokenBucket, RedisSlidingWindow
 
 """"
 get_instance method accepts an algorithm as input and 
 provides the corresponding object associated with it as its output. 
 This allows us to select from different rate-limiting algorithms 
 We can dynamically generate an instance of the object using this Factory Class.
+When a Redis URL or client is given, the Redis backed version of the algorithm is returned:
+one instance then serves all the clients and its allow_request is a coroutine.
+The other keyword arguments are the limits of the algorithm (eg. total_capacity for TokenBucket).
 """
 class RateLimitFactory:
    @staticmethod
-   def get_instance(algorithm:str = None):
+   def get_instance(algorithm:str = None, redis_url:str = None, redis_client = None, **kwargs):
+    if redis_url is not None or redis_client is not None:
+        if redis_url is not None:
+            kwargs["redis_url"] = redis_url
+        if algorithm== "TokenBucket":
+            return RedisTokenBucket(redis_client=redis_client, **kwargs)
+
+        elif algorithm== "FixedCounterWindow":
+            return RedisFixedCounterWindow(redis_client=redis_client, **kwargs)
+
+        else:
+            return RedisSlidingWindow(redis_client=redis_client, **kwargs)
+
     if algorithm== "TokenBucket":
-        return TokenBucket()
+        return TokenBucket(**kwargs)
     
     elif algorithm== "FixedCounterWindow":
-        return FixedCounterWindow()
+        return FixedCounterWindow(**kwargs)
 
     else:
-        return SlidingWindow()
\ No newline at end of file
+        return SlidingWindow(**kwargs)
\ No newline at end of file
@@ -0,0 +1,186 @@
+from .limiting_algorithms import RateLimit, RateLimitExceeded
+
+"""
+Redis backed versions of the limiting algorithms. The state of every client lives in Redis,
+so the limits hold for all the uvicorn workers and gateway instances sharing the same Redis.
+Each check is a single Lua script, executed atomically by Redis, reading and writing one small hash:
+the cost is O(1) whatever the number of requests in the window.
+The clock is the Redis server clock (TIME), so the gateway instances don't need synchronised clocks.
+Idle keys expire on their own once their state is back to the initial one.
+The scripts return whether the request is allowed and the number of seconds to wait before retrying.
+"""
+
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+-- The bucket is full again after this time, the key is not needed anymore
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+FIXED_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local window = math.floor(now / interval)
+
+local state = redis.call('HMGET', KEYS[1], 'window', 'count')
+local count = 0
+if tonumber(state[1]) == window then
+    count = tonumber(state[2])
+end
+
+if count + cost > limit then
+    return {0, tostring((window + 1) * interval - now)}
+end
+redis.call('HSET', KEYS[1], 'window', window, 'count', count + cost)
+redis.call('EXPIRE', KEYS[1], interval)
+return {1, '0'}
+"""
+
+# Sliding window counter: the count of the previous window is weighted by the part of it
+# still inside the sliding window, instead of keeping a log of the requests timestamps.
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local window = math.floor(now / interval)
+local elapsed = now - window * interval
+
+local state = redis.call('HMGET', KEYS[1], 'window', 'current', 'previous')
+local last_window = tonumber(state[1])
+local current = tonumber(state[2]) or 0
+local previous = tonumber(state[3]) or 0
+if last_window == window - 1 then
+    previous = current
+    current = 0
+elseif last_window ~= window then
+    previous = 0
+    current = 0
+end
+
+local estimate = previous * (1 - elapsed / interval) + current
+if estimate + cost > limit then
+    -- The estimate decreases by previous / interval per second until the end of the window
+    local retry_after = interval - elapsed
+    if previous > 0 then
+        retry_after = math.min(retry_after, (estimate + cost - limit) * interval / previous)
+    end
+    return {0, tostring(retry_after)}
+end
+redis.call('HSET', KEYS[1], 'window', window, 'current', current + cost, 'previous', previous)
+redis.call('EXPIRE', KEYS[1], 2 * interval)
+return {1, '0'}
+"""
+
+# Implement the RedisRateLimit class, which inherits from the RateLimit class.
+class RedisRateLimit(RateLimit):
+    """
+    Base class of the Redis backed algorithms. A single instance serves all the clients:
+    the client and the route are part of the Redis key, the route defaults to the whole API.
+    The client and route are used as hash tag, so with Redis Cluster the keys are sharded per client/route.
+    allow_request is a coroutine, it uses the asyncio Redis client.
+    """
+    name = None
+    script_source = None
+
+    def __init__(self, redis_client=None, redis_url="redis://localhost:6379/0", prefix="ratelimit"):
+        super().__init__()
+        if redis_client is None:
+            import redis.asyncio as redis
+            redis_client = redis.from_url(redis_url)
+        self.redis = redis_client
+        self.prefix = prefix
+        # The script is sent once, then called by its SHA1
+        self.script = self.redis.register_script(self.script_source)
+
+    def get_key(self, ip, route="*"):
+        return f"{self.prefix}:{self.name}:{{{ip}:{route}}}"
+
+    def get_args(self, cost):
+        raise NotImplementedError
+
+    async def allow_request(self, ip, route="*", cost=1):
+        if cost > self.get_max_cost():
+            raise ValueError(f"cost {cost} can never be allowed by {self.name} (max {self.get_max_cost()})")
+        allowed, retry_after = await self.script(keys=[self.get_key(ip, route)], args=self.get_args(cost))
+        if int(allowed) != 1:
+            raise RateLimitExceeded(retry_after=float(retry_after))
+        return True
+
+# Implement the RedisTokenBucket class, which inherits from the RedisRateLimit class.
+class RedisTokenBucket(RedisRateLimit):
+    """
+    Token bucket with the same defaults as TokenBucket: 10 tokens, refilled at 1 token per second.
+    """
+    name = "token_bucket"
+    script_source = TOKEN_BUCKET_SCRIPT
+
+    def __init__(self, total_capacity=10, tokens_per_interval=1, token_interval=1, **kwargs):
+        super().__init__(**kwargs)
+        self.total_capacity = total_capacity
+        self.tokens_per_interval = tokens_per_interval
+        self.token_interval = token_interval
+
+    def get_args(self, cost):
+        return [self.total_capacity, self.tokens_per_interval / self.token_interval, cost]
+
+    def get_max_cost(self):
+        return self.total_capacity
+
+# Implement the RedisFixedCounterWindow class, which inherits from the RedisRateLimit class.
+class RedisFixedCounterWindow(RedisRateLimit):
+    """
+    Fixed window counter with the same defaults as FixedCounterWindow: 60 requests per minute,
+    the windows are aligned on the Redis clock.
+    """
+    name = "fixed_window"
+    script_source = FIXED_WINDOW_SCRIPT
+
+    def __init__(self, limit_per_interval=60, interval=60, **kwargs):
+        super().__init__(**kwargs)
+        self.limit_per_interval = limit_per_interval
+        self.interval = interval
+
+    def get_args(self, cost):
+        return [self.limit_per_interval, self.interval, cost]
+
+# Implement the RedisSlidingWindow class, which inherits from the RedisRateLimit class.
+class RedisSlidingWindow(RedisRateLimit):
+    """
+    Sliding window counter with the same defaults as SlidingWindow: 60 requests in any 60 seconds.
+    Only the counts of the current and previous windows are stored, the number of requests
+    in the sliding window is estimated assuming the previous ones were evenly spread.
+    """
+    name = "sliding_window"
+    script_source = SLIDING_WINDOW_SCRIPT
+
+    def __init__(self, limit_per_interval=60, interval=60, **kwargs):
+        super().__init__(**kwargs)
+        self.limit_per_interval = limit_per_interval
+        self.interval = interval
+
+    def get_args(self, cost):
+        return [self.limit_per_interval, self.interval, cost]
\ No newline at end of file
@@ -4,11 +4,15 @@ def change_type_discrimination(
     prob_t1: ee.Image, 
     prob_t2: ee.Image, 
     changed_mask: ee.Image, 
-    n_classes: int
+    n_classes: int,
+    method: str = 'cosine'
 ) -> ee.Image:
     """
     Compute the change type (class transition) for each pixel that changed.
     
+    With method='argmax', use change_type_discrimination_argmax instead, which builds a
+    constant-size graph.
+    
     For each pixel with change (changed_mask == 1), this function calculates the change vector:
       δ = prob_t2 - prob_t1
     and then computes the cosine similarity between δ and the theoretical transition vector 
@@ -27,11 +31,15 @@ def change_type_discrimination(
       prob_t2 (ee.Image): Multiband image of class probabilities at time t2.
       changed_mask (ee.Image): Binary image (1 for changed pixels, 0 for unchanged).
       n_classes (int): Number of classes.
+      method (str): 'cosine' to compare delta with every transition vector, 'argmax' for
+        the closed-form reduction. Default is 'cosine'.
     
     Returns:
       ee.Image: An image where each pixel is assigned the transition code (a*100 + b) corresponding 
                 to the change type with the highest cosine similarity. Unchanged pixels are set to 0.
     """
+    if method == 'argmax':
+        return change_type_discrimination_argmax(prob_t1, prob_t2, changed_mask)
     
     # sqrt2 is used to normalize the theoretical transition vector, whose norm is sqrt(2)
     sqrt2 = ee.Number(2).sqrt()
@@ -90,3 +98,50 @@ def change_type_discrimination(
     change_map = change_map.where(changed_mask.Not(), 0)
     
     return change_map
+
+
+
+def change_type_discrimination_argmax(
+    prob_t1: ee.Image, 
+    prob_t2: ee.Image, 
+    changed_mask: ee.Image
+) -> ee.Image:
+    """
+    Compute the change type (class transition) for each pixel that changed, in closed form.
+    
+    The cosine between delta = prob_t2 - prob_t1 and a transition vector (P[b] - P[a]) is
+      cos = (delta[b] - delta[a]) / (||delta|| * sqrt(2))
+    so the transition with the maximum cosine is given by b = argmax(delta) and
+    a = argmin(delta). Both are computed with a band index reduction, so the graph has the
+    same size whatever the number of classes.
+    
+    On ties, the first band is selected (lowest a, then lowest b). Pixels where delta is
+    constant (no change vector) are assigned a value of 0, as are pixels with no change
+    (changed_mask == 0).
+    
+    Args:
+      prob_t1 (ee.Image): Multiband image of class probabilities at time t1.
+      prob_t2 (ee.Image): Multiband image of class probabilities at time t2.
+      changed_mask (ee.Image): Binary image (1 for changed pixels, 0 for unchanged).
+    
+    Returns:
+      ee.Image: An image where each pixel is assigned the transition code (a*100 + b) corresponding 
+                to the change type with the highest cosine similarity. Unchanged pixels are set to 0.
+    """
+    
+    # Compute the change vector delta = prob_t2 - prob_t1, as a 1D array per pixel
+    delta = prob_t2.subtract(prob_t1).toArray()
+    
+    # Index of the band with the largest increase (b) and of the band with the largest
+    # decrease (a)
+    b = delta.arrayArgmax().arrayGet([0])
+    a = delta.multiply(-1).arrayArgmax().arrayGet([0])
+    
+    # Transition code (a*100 + b), 0 where delta is constant
+    change_map = a.multiply(100).add(b).toInt32()
+    change_map = change_map.where(a.eq(b), 0).rename('change_map')
+    
+    # For pixels with no detected change, force the change code to 0
+    change_map = change_map.where(changed_mask.Not(), 0)
+    
+    return change_map
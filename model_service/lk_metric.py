@@ -12,3 +12,47 @@ def compute_Lk(magnitude, class_t1, class_t2, threshold, roi, scale):
     A = true_change.reduceRegion(reducer=ee.Reducer.sum(), geometry=roi, scale=scale).values().get(0)
     Lk_value = ee.Number(Ak1).subtract(Ak2).multiply(100).divide(A)
     return Lk_value
+
+
+def compute_change_histogram(magnitude, class_t1, class_t2, roi, scale, n_bins=1000):
+    """
+    Compute the histograms of the magnitude over the true change and the true no change
+    pixels, with common fixed bins spanning the magnitude range, in a single request.
+    """
+    true_change = class_t1.neq(class_t2)
+    min_max = magnitude.reduceRegion(reducer=ee.Reducer.minMax(), geometry=roi, scale=scale).values()
+    vmin = ee.Number(min_max.reduce(ee.Reducer.min()))
+    vmax = ee.Number(min_max.reduce(ee.Reducer.max()))
+    # Values equal to the max are outside of the fixed histogram range [min, max), add one bin
+    bin_width = vmax.subtract(vmin).divide(n_bins).max(1e-12)
+    masked_magnitude = ee.Image.cat([
+        magnitude.updateMask(true_change).rename('change'),
+        magnitude.updateMask(true_change.Not()).rename('no_change')])
+    histogram = masked_magnitude.reduceRegion(
+        reducer=ee.Reducer.fixedHistogram(vmin, vmin.add(bin_width.multiply(n_bins + 1)), n_bins + 1),
+        geometry=roi, scale=scale)
+    A = true_change.reduceRegion(reducer=ee.Reducer.sum(), geometry=roi, scale=scale).values().get(0)
+    return ee.Dictionary({
+        'change': histogram.get('change'),
+        'no_change': histogram.get('no_change'),
+        'A': A}).getInfo()
+
+
+def compute_Lk_curve(histogram):
+    """
+    Compute the Lk metric for every bin edge of the histograms returned by
+    compute_change_histogram, using cumulative counts.
+    Returns the list of thresholds and the list of Lk values.
+    """
+    change = histogram['change'] or []
+    no_change = histogram['no_change'] or []
+    A = histogram['A']
+    thresholds = [row[0] for row in change] or [row[0] for row in no_change]
+    # Number of pixels with magnitude >= threshold, from the highest bin to the lowest
+    Ak1 = Ak2 = 0.0
+    Lk_values = [0.0] * len(thresholds)
+    for i in reversed(range(len(thresholds))):
+        Ak1 += change[i][1] if i < len(change) else 0.0
+        Ak2 += no_change[i][1] if i < len(no_change) else 0.0
+        Lk_values[i] = (Ak1 - Ak2) * 100 / A if A else 0.0
+    return thresholds, Lk_values
@@ -1,11 +1,16 @@
 import ee
 
-from lk_metric import compute_Lk
+from lk_metric import compute_Lk, compute_change_histogram, compute_Lk_curve
 
-def threshold_optimization(magnitude, class_t1, class_t2, roi, scale, step_coarse=0.1, step_fine=0.01, tolerance=1e-3, max_iterations=10):
+def threshold_optimization(magnitude, class_t1, class_t2, roi, scale, step_coarse=0.1, step_fine=0.01, tolerance=1e-3, max_iterations=10, method='iterative', n_bins=1000):
     """
     Optimize the threshold to maximize the Lk metric.
+    With method='histogram', use threshold_optimization_histogram instead of the
+    iterative coarse/fine search.
     """
+    if method == 'histogram':
+        return threshold_optimization_histogram(magnitude, class_t1, class_t2, roi, scale, n_bins)
+
     vmin = magnitude.reduceRegion(ee.Reducer.min(), roi, scale).values().get(0).getInfo()
     vmax = magnitude.reduceRegion(ee.Reducer.max(), roi, scale).values().get(0).getInfo()
     best_threshold = vmin
@@ -50,3 +55,18 @@ def threshold_optimization(magnitude, class_t1, class_t2, roi, scale, step_coars
             improved = True
 
     return best_threshold, best_Lk
+
+
+def threshold_optimization_histogram(magnitude, class_t1, class_t2, roi, scale, n_bins=1000):
+    """
+    Optimize the threshold to maximize the Lk metric, with a single request.
+    The histograms of the magnitude over the true change and no change pixels are
+    computed on server side, then Lk is computed locally for every bin edge, which
+    gives the exact optimum at the resolution of the histograms (range / n_bins).
+    """
+    histogram = compute_change_histogram(magnitude, class_t1, class_t2, roi, scale, n_bins)
+    thresholds, Lk_values = compute_Lk_curve(histogram)
+    if not thresholds:
+        return None, -9999.0
+    best_index = max(range(len(Lk_values)), key=lambda i: Lk_values[i])
+    return thresholds[best_index], Lk_values[best_index]
@@ -40,8 +40,14 @@ def run_prediction():
     rgb_paths = [
       url_for('static',filename='rgb00.png'),
       url_for('static',filename='rgb01.png')]
+    # Reuse the same output buffer for both images when they have the same
+    # dimensions
+    rgb = None
     for i_img in range(2):
-        rgb = images[i_img].to_rgb(gamma=0.66)
+        if rgb is not None and \
+            rgb.shape[:2] != (images[i_img].height, images[i_img].width):
+            rgb = None
+        rgb = images[i_img].to_rgb(gamma=0.66, out=rgb)
         Image.fromarray(rgb).save("." + rgb_paths[i_img])
 
     prediction_path = url_for('static',filename='prediction.png')
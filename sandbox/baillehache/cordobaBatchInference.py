@@ -0,0 +1,182 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Callable
+import torch
+import cv2
+from torch.utils.data import Dataset, DataLoader
+from cordobaOnnx import *
+from cordobaQuantization import (
+    QUANTIZATION_MODES, get_quantized_path, list_images, load_image,
+    get_prediction)
+
+
+def read_manifest(path: str) -> List[dict]:
+    """
+    Read a manifest of image pairs. Each line of the manifest contains the
+    paths of the t1 and t2 images separated by a comma, and optionally the
+    name of the output mask (default: the file name of the t1 image). Paths
+    are relative to the directory of the manifest. Empty lines and lines
+    starting with '#' are ignored.
+    path: path to the manifest
+    Return the list of samples as dictionaries with keys 'inputs' (list of
+    paths) and 'name'
+    """
+    root = os.path.dirname(path)
+    samples = []
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            fields = [field.strip() for field in line.split(",")]
+            inputs = [os.path.join(root, field) for field in fields[:2]]
+            name = fields[2] if len(fields) > 2 else os.path.basename(fields[0])
+            samples.append({"inputs": inputs, "name": name})
+    return samples
+
+
+def list_pairs(path: str) -> List[dict]:
+    """
+    List the image pairs to process
+    path: path to a directory containing the subfolders 't1' and 't2' (cf
+    cordobaQuantization.list_images), or to a manifest (cf read_manifest)
+    Return the list of samples as dictionaries with keys 'inputs' (list of
+    paths) and 'name'
+    """
+    if os.path.isdir(path):
+        return [
+            {"inputs": sample["inputs"], "name": os.path.basename(sample["inputs"][0])}
+            for sample in list_images(path, 2)]
+    return read_manifest(path)
+
+
+class CordobaPairDataset(Dataset):
+    """
+    Class implementing the dataset of image pairs for batch inference. The
+    images are decoded and normalised in the DataLoader workers.
+    """
+
+    def __init__(self, samples: List[dict], mean: List[float], std: List[float]):
+        """
+        Constructor for an instance of CordobaPairDataset
+        samples: the image pairs (cf list_pairs)
+        mean, std: normalisation of the RGB values in [0,1]
+        """
+        self.samples = samples
+        self.mean = mean
+        self.std = std
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def __getitem__(self, index: int) -> dict:
+        sample = self.samples[index]
+        pre, post = [
+            load_image(input_path, self.mean, self.std)
+            for input_path in sample["inputs"]]
+        return {"pre": pre, "post": post, "name": sample["name"]}
+
+
+def run_batch_inference(
+    forward: Callable[[torch.Tensor, torch.Tensor], torch.Tensor],
+    architecture: str,
+    samples: List[dict],
+    output_path: str,
+    batch_size: int = 8,
+    nb_workers: int = 4,
+    nb_writers: int = 2,
+    flag_verbose: bool = True) -> dict:
+    """
+    Run a change detection network on image pairs and save the masks
+    forward: function taking the batches of pre and post images and
+    returning the logits
+    architecture: the name of the network, one of ONNX_ARCHITECTURES
+    samples: the image pairs (cf list_pairs), all the images must have the
+    same size
+    output_path: path to the directory where the masks are saved (PNG,
+    white is changed area)
+    batch_size: number of pairs processed together
+    nb_workers: number of processes decoding the images
+    nb_writers: number of threads saving the masks
+    flag_verbose: if True display the progress on the standard output
+    Return a dictionary with the number of images, the duration in seconds
+    and the number of images per second
+    """
+    spec = ONNX_ARCHITECTURES[architecture]
+    os.makedirs(output_path, exist_ok=True)
+    dataset = CordobaPairDataset(samples, spec["mean"], spec["std"])
+    loader = DataLoader(
+        dataset,
+        batch_size=batch_size,
+        num_workers=nb_workers,
+        prefetch_factor=2 if nb_workers > 0 else None,
+        persistent_workers=False)
+
+    start = time.perf_counter()
+    nb_images = 0
+    with ThreadPoolExecutor(max_workers=nb_writers) as writers:
+        pending = []
+        for batch in loader:
+            with torch.inference_mode():
+                logits = forward(batch["pre"], batch["post"])
+
+            # Save the masks in the background while the next batch is
+            # processed
+            for name, sample_logits in zip(batch["name"], logits):
+                mask = get_prediction(sample_logits) * 255
+                mask_path = os.path.join(
+                    output_path, f"{os.path.splitext(name)[0]}.png")
+                pending.append(writers.submit(cv2.imwrite, mask_path, mask))
+            nb_images += len(batch["name"])
+
+            # Bound the number of masks waiting to be saved
+            while len(pending) > 4 * batch_size:
+                pending.pop(0).result()
+
+            if flag_verbose:
+                duration = time.perf_counter() - start
+                print(f"{nb_images}/{len(dataset)} images, {nb_images / duration:.2f} images/s")
+                sys.stdout.flush()
+        for future in pending:
+            future.result()
+
+    duration = time.perf_counter() - start
+    return {
+        "nb_images": nb_images,
+        "duration": duration,
+        "images_per_second": nb_images / duration if duration > 0 else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a change detection network on a directory or manifest of image pairs")
+    parser.add_argument("architecture", choices=["fccdn", "bit_cd"])
+    parser.add_argument("weights", help="path to the PyTorch weights file, or the ONNX file with --backend onnx")
+    parser.add_argument("input", help="directory with subfolders t1 and t2, or manifest (t1,t2[,name] per line)")
+    parser.add_argument("output", help="directory where the masks are saved")
+    parser.add_argument("--batch_size", type=int, default=8)
+    parser.add_argument("--num_workers", type=int, default=4)
+    parser.add_argument("--num_writers", type=int, default=2)
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="torch")
+    parser.add_argument("--quantization", choices=QUANTIZATION_MODES, default=None)
+    args = parser.parse_args()
+
+    if args.backend == "torch":
+        if args.quantization is not None:
+            parser.error("--quantization requires --backend onnx")
+        forward = load_architecture(args.architecture, args.weights)
+    else:
+        onnx_path = args.weights
+        if args.quantization is not None:
+            onnx_path = get_quantized_path(onnx_path, args.quantization)
+        forward = CordobaOnnxModel(onnx_path)
+
+    samples = list_pairs(args.input)
+    result = run_batch_inference(
+        forward, args.architecture, samples, args.output,
+        args.batch_size, args.num_workers, args.num_writers)
+    print(f"processed {result['nb_images']} image pairs in {result['duration']:.1f}s ({result['images_per_second']:.2f} images/s)")
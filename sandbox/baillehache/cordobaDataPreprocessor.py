@@ -9,6 +9,8 @@ import io
 import sys
 import math
 import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cordobaTileCache import CordobaTileCache
 
 class CordobaDataSource(Enum):
     """
@@ -55,12 +57,91 @@ class LongLatBBox:
         return ee.Geometry.Rectangle(
           [self.long_from, self.lat_from, self.long_to, self.lat_to]) 
 
+    def to_mercator(self) -> List[float]:
+        """
+        Convert a LongLatBBox to the world mercator projection ("EPSG:3395")
+        Return the bounding coordinates in meters as
+        [x_min, x_max, y_min, y_max]
+        """
+        # WGS84 ellipsoid semi-major axis and eccentricity
+        radius = 6378137.0
+        eccentricity = 0.0818191908426215
+
+        def project_lat(lat: float) -> float:
+            phi = math.radians(lat)
+            e_sin_phi = eccentricity * math.sin(phi)
+            return radius * math.log(
+                math.tan(math.pi / 4.0 + phi / 2.0) *
+                ((1.0 - e_sin_phi) / (1.0 + e_sin_phi)) ** (eccentricity / 2.0))
+
+        xs = [radius * math.radians(self.long_from),
+              radius * math.radians(self.long_to)]
+        ys = [project_lat(self.lat_from), project_lat(self.lat_to)]
+        return [min(xs), max(xs), min(ys), max(ys)]
+
     def __str__(self):
         """
         String representation
         """
         return f"lo[{self.long_from},{self.long_to}],la[{self.lat_from},{self.lat_to}]"
 
+class SpectralIndex:
+    """
+    Spectral index calculated from the bands of a CordobaImage, defined as
+    scale * (numerator + numerator_offset) / (denominator + denominator_offset)
+    where numerator and denominator are linear combinations of bands
+    """
+    def __init__(self,
+        numerator: dict, denominator: dict, scale: float = 1.0,
+        numerator_offset: float = 0.0, denominator_offset: float = 0.0):
+        """
+        Constructor for an instance of SpectralIndex.
+        numerator, denominator: linear combinations of bands, as dictionaries
+        of band name to coefficient (eg. {"nir": 1.0, "red": -1.0})
+        scale: the scale applied to the ratio
+        numerator_offset, denominator_offset: constants added to the linear
+        combinations
+        """
+        self.numerator = numerator
+        self.denominator = denominator
+        self.scale = scale
+        self.numerator_offset = numerator_offset
+        self.denominator_offset = denominator_offset
+
+    def get_bands_name(self) -> List[str]:
+        """
+        Return the list of bands name used by the index
+        """
+        return sorted(set(self.numerator) | set(self.denominator))
+
+# Spectral indices available for local calculation, dictionary key is the
+# index name, dictionary value is a SpectralIndex.
+# Indices are written such as they share their linear combinations when
+# possible (nir - red for ndvi and evi, nir - swir and nir + swir for ndmi
+# and ndbi) to calculate them only once.
+SPECTRAL_INDICES = {
+    "ndvi": SpectralIndex(
+        {"nir": 1.0, "red": -1.0}, {"nir": 1.0, "red": 1.0}),
+    "ndmi": SpectralIndex(
+        {"nir": 1.0, "swir": -1.0}, {"nir": 1.0, "swir": 1.0}),
+    # (swir - nir) / (swir + nir)
+    "ndbi": SpectralIndex(
+        {"nir": 1.0, "swir": -1.0}, {"nir": 1.0, "swir": 1.0}, scale=-1.0),
+    # 2.5 * (nir - red) / (nir + 6.0 * red - 7.5 * blue + 1.0)
+    "evi": SpectralIndex(
+        {"nir": 1.0, "red": -1.0},
+        {"nir": 1.0, "red": 6.0, "blue": -7.5},
+        scale=2.5, denominator_offset=1.0),
+}
+
+def register_spectral_index(name: str, index: SpectralIndex):
+    """
+    Register a spectral index for local calculation by CordobaImage
+    name: the name of the index, also used as the name of its band
+    index: the index definition
+    """
+    SPECTRAL_INDICES[name] = index
+
 class CordobaImage:
     """
     Class representing an image (raw data and extra data) ready to use by the
@@ -86,6 +167,10 @@ class CordobaImage:
         self.height = height
         self.source = None
 
+        # Number of rows processed at once when rendering the bands, bounds
+        # the size of the temporary buffer used during rendering
+        self.render_block_rows = 256
+
         # Contains image data per band, dictionary key is the band name,
         # dictionary value is a numpy array of the value of the band
         self.bands = {}
@@ -103,77 +188,97 @@ class CordobaImage:
         """
         return f"acquisition date: {self.date}, area: {self.area}, resolution: {self.resolution}m/px, width: {self.width}px, height: {self.height}px"
 
-    def to_rgb(self, gamma=1.0) -> numpy.array:
+    def get_render_max(self, band_names: List[str]) -> float:
         """
-        Convert a CordobaImage into a RGB array
-        Return the composite of red, green, blue bands as a numpy array.
-        Pixel values in [0,255]. Red, gree, blue bands normalised.
+        Get the max value over several bands, used for normalisation when
+        rendering the bands. Non finite values (NaN, inf) are ignored.
+        band_names: the bands to use
+        Return the max value, or 1.0 if there is no positive value
         """
-        
-        # Get the max value over red, green, blue bands for normalisation
-        max_val = max(self.bands["red"].max(), max(self.bands["green"].max(), self.bands["blue"].max()))
+        max_val = 0.0
+        for band in band_names:
+            data = self.bands[band]
+            max_val = max(max_val,
+                float(numpy.max(data, where=numpy.isfinite(data), initial=0.0)))
         if max_val == 0.0:
             max_val = 1.0
-
-        # Create the result image
-        image = numpy.zeros([self.height, self.width, 3], numpy.uint8)
-        
-        # Loop over the pixels
-        for y in range(self.height):
-            for x in range(self.width):
-
-                # Composite the normalised bands
-                image[y][x][0] = \
-                  ((self.bands["red"][y][x] / max_val) ** gamma) * 255.0
-                image[y][x][1] = \
-                  ((self.bands["green"][y][x] / max_val) ** gamma) * 255.0
-                image[y][x][2] = \
-                  ((self.bands["blue"][y][x] / max_val) ** gamma) * 255.0
+        return max_val
+
+    def render(self,
+        band_names: List[str],
+        gamma: float = 1.0,
+        out: numpy.ndarray = None) -> numpy.array:
+        """
+        Render one or three bands of a CordobaImage into a uint8 array
+        band_names: the bands to use, one band is rendered in grey scale, three
+        bands are rendered as the red, green, blue channels
+        gamma: gamma correction
+        out: optional output buffer, a numpy.uint8 array of shape
+        (height, width, 3). If None, a new array is allocated.
+        Return the output buffer.
+        Pixel values in [0,255]. Bands normalised with their common max value.
+        NaN and -inf are rendered as 0, +inf as 255, negative values are
+        clipped to 0.
+        """
+        shape = (self.height, self.width, 3)
+        if out is None:
+            out = numpy.empty(shape, numpy.uint8)
+        elif out.shape != shape or out.dtype != numpy.uint8:
+            raise ValueError(
+                f"output buffer must be a numpy.uint8 array of shape {shape}, "
+                f"got {out.dtype} {out.shape}")
+
+        # Get the max value over the bands for normalisation
+        max_val = self.get_render_max(band_names)
+
+        # Process the image per block of rows to bound the size of the
+        # temporary float buffer, whatever the size of the image
+        nb_rows = max(1, min(self.render_block_rows, self.height))
+        buffer = numpy.empty((nb_rows, self.width), numpy.float32)
+        for row_from in range(0, self.height, nb_rows):
+            row_to = min(row_from + nb_rows, self.height)
+            block = buffer[:row_to - row_from]
+
+            # Normalise, clean up and gamma correct each band, then pack it
+            # into its channel
+            for i_channel, band in enumerate(band_names):
+                numpy.divide(
+                    self.bands[band][row_from:row_to], max_val, out=block)
+                numpy.nan_to_num(
+                    block, copy=False, nan=0.0, posinf=1.0, neginf=0.0)
+                numpy.clip(block, 0.0, 1.0, out=block)
+                if gamma != 1.0:
+                    numpy.power(block, gamma, out=block)
+                numpy.multiply(block, 255.0, out=block)
+                out[row_from:row_to, :, i_channel] = block
+
+            # Grey scale, copy the band in the other channels
+            if len(band_names) == 1:
+                out[row_from:row_to, :, 1] = out[row_from:row_to, :, 0]
+                out[row_from:row_to, :, 2] = out[row_from:row_to, :, 0]
 
         # Return the result image
-        return image
+        return out
 
-    def to_grey_scale(self, band) -> numpy.array:
+    def to_rgb(self, gamma=1.0, out=None) -> numpy.array:
+        """
+        Convert a CordobaImage into a RGB array
+        gamma: gamma correction
+        out: optional output buffer (cf render())
+        Return the composite of red, green, blue bands as a numpy array.
+        Pixel values in [0,255]. Red, gree, blue bands normalised.
+        """
+        return self.render(["red", "green", "blue"], gamma, out)
+
+    def to_grey_scale(self, band, out=None) -> numpy.array:
         """
         Convert a CordobaImage into a numpy array
         band: the band to use
+        out: optional output buffer (cf render())
         Return the numpy array.
         Pixel values in [0,255]. Values normalised.
         """
-        
-        # Get the max value for normalisation
-        max_val = self.bands[band].max()
-        if max_val == 0.0:
-            max_val = 1.0
-
-        # Create the result image
-        image = numpy.zeros([self.height, self.width, 3], numpy.uint8)
-        
-        # Variable to memorise eventual exceptions
-        raised_exc = None
-
-        # Loop over the pixels
-        for y in range(self.height):
-            for x in range(self.width):
- 
-                # Convert the band value to a pixel value
-                try:
-                    pixel_value = int(self.bands[band][y][x] / max_val * 255.0)
-                except Exception as exc:
-                    raised_exc = exc
-                    pixel_value = 0
-
-                # Composite the normalised bands
-                image[y][x][0] = pixel_value
-                image[y][x][1] = image[y][x][0]
-                image[y][x][2] = image[y][x][0]
-
-        # Inform the user if there has been exception
-        if raised_exc:
-            print(f"Exception raised during conversion:\n{raised_exc}")
-
-        # Return the result image
-        return image
+        return self.render([band], 1.0, out)
 
     def to_dynamic_world_mask(self, band: str) -> numpy.array:
         """
@@ -196,37 +301,41 @@ class CordobaImage:
     def get_mean_ndvi(self) -> float:
         return numpy.mean(self.bands["ndvi"])
 
-    def to_ndvi(self) -> numpy.array:
+    def to_ndvi(self, out=None) -> numpy.array:
         """
         Convert a CordobaImage into a NDVI array
+        out: optional output buffer (cf render())
         Return the NDVI as a numpy array.
         Pixel values in [0,255], 3 channels. NDVI band normalised.
         """
-        return self.to_grey_scale("ndvi")
+        return self.to_grey_scale("ndvi", out)
 
-    def to_ndmi(self) -> numpy.array:
+    def to_ndmi(self, out=None) -> numpy.array:
         """
         Convert a CordobaImage into a NDMI array
+        out: optional output buffer (cf render())
         Return the NDMI as a numpy array.
         Pixel values in [0,255], 3 channels. NDMI band normalised.
         """
-        return self.to_grey_scale("ndmi")
+        return self.to_grey_scale("ndmi", out)
 
-    def to_ndbi(self) -> numpy.array:
+    def to_ndbi(self, out=None) -> numpy.array:
         """
         Convert a CordobaImage into a NDBI array
+        out: optional output buffer (cf render())
         Return the NDBI as a numpy array.
         Pixel values in [0,255], 3 channels. NDBI band normalised.
         """
-        return self.to_grey_scale("ndbi")
+        return self.to_grey_scale("ndbi", out)
 
-    def to_evi(self) -> numpy.array:
+    def to_evi(self, out=None) -> numpy.array:
         """
         Convert a CordobaImage into a EVI array
+        out: optional output buffer (cf render())
         Return the EVI as a numpy array.
         Pixel values in [0,255], 3 channels. EVI band normalised.
         """
-        return self.to_grey_scale("evi")
+        return self.to_grey_scale("evi", out)
 
     def dark_object_correction(self):
         """
@@ -243,39 +352,68 @@ class CordobaImage:
             # Substract the minimum value to all values in the band
             self.bands[band] -= min_value
 
+    def get_linear_combination(self,
+        coefficients: dict, offset: float, cache: dict) -> numpy.array:
+        """
+        Calculate a linear combination of bands
+        coefficients: dictionary of band name to coefficient
+        offset: constant added to the combination
+        cache: dictionary of the combinations already calculated, updated
+        with the result
+        Return the combination as a numpy float32 2D array.
+        """
+        key = (tuple(sorted(coefficients.items())), offset)
+        if key not in cache:
+            combination = \
+                numpy.full([self.height, self.width], offset, numpy.float32)
+            buffer = numpy.empty([self.height, self.width], numpy.float32)
+            for band, coefficient in key[0]:
+                numpy.multiply(self.bands[band], coefficient, out=buffer)
+                combination += buffer
+            cache[key] = combination
+        return cache[key]
+
+    def add_indices(self, indices: List[str] = None):
+        """
+        Add spectral index bands to the Cordoba image and calculate their
+        value based on other bands (cf SPECTRAL_INDICES)
+        indices: the names of the indices to add, if None add all the
+        registered indices
+        The image is updated. Where an index can't be calculated (denominator
+        equal to zero, non finite values), its value is set to 0.0.
+        """
+        if indices is None:
+            indices = list(SPECTRAL_INDICES.keys())
+
+        # Linear combinations shared between the indices
+        cache = {}
+
+        # Loop on the indices
+        for name in indices:
+            index = SPECTRAL_INDICES[name]
+
+            # Get the numerator and denominator of the index
+            numerator = self.get_linear_combination(
+                index.numerator, index.numerator_offset, cache)
+            denominator = self.get_linear_combination(
+                index.denominator, index.denominator_offset, cache)
+
+            # Calculate the index, only where the division is safe
+            valid = numpy.isfinite(numerator) & numpy.isfinite(denominator)
+            valid &= denominator != 0.0
+            band = numpy.zeros([self.height, self.width], numpy.float32)
+            numpy.divide(numerator, denominator, out=band, where=valid)
+            if index.scale != 1.0:
+                band *= index.scale
+            self.bands[name] = band
+
     def add_ndvi(self):
         """
         Add a 'ndvi' band to the Cordoba image and calculate its value based
         on other bands
         The image is updated.
         """
-
-        # Add the new band
-        self.bands["ndvi"] = \
-            numpy.zeros([self.height, self.width], numpy.float32)
-
-        # Variable to memorise eventual exceptions
-        raised_exc = None
-
-        # Loop on the pixels
-        for y in range(self.height):
-            for x in range(self.width):
-
-                # Calculate the NDVI value
-                try:
-                    ndvi_value = \
-                        (self.bands["nir"][y][x] - self.bands["red"][y][x]) / \
-                        (self.bands["nir"][y][x] + self.bands["red"][y][x])
-                except Exception as exc:
-                    raised_exc = exc
-                    ndvi_value = 0.0
-
-                # Update the NDVI value
-                self.bands["ndvi"][y][x] = ndvi_value
-
-        # Inform the user if there has been exception
-        if raised_exc:
-            print(f"Exception raised during conversion:\n{raised_exc}")
+        self.add_indices(["ndvi"])
 
 
 # Helper function to discard clouds when calculating the median of several
@@ -343,20 +481,36 @@ class CordobaDataPreprocessor:
         # threshold, divide the data into chunks of downloadable size
         self.max_area_angle = 0.1
 
+        # Max number of chunks downloaded concurrently
+        self.nb_download_workers = 8
+
+        # Timeout in seconds for the download of one chunk
+        self.download_timeout = 300.0
+
+        # HTTP session shared by the downloads (created when needed)
+        self.http_session = None
+
+        # Cache of the downloaded chunks, a CordobaTileCache, if None the
+        # chunks are not cached
+        self.tile_cache = None
+
         # Flag to control cloud filtering when compositing several images
         # Default is False because it creates dirty artefacts
         self.flag_cloud_filtering = False
 
-    def search_dataset_range(self, date: str, area: LongLatBBox, source: CordobaDataSource) -> ee.ImageCollection:
+        # Flag to calculate the spectral indices locally on the downloaded
+        # bands instead of on GEE side (less data to download)
+        self.flag_local_indices = False
+
+    def get_ee_dataset(self, area: LongLatBBox, source: CordobaDataSource) -> ee.ImageCollection:
         """
-        Search dates around a given date for which an ee.ImageCollection
-        containing at least one image for a given area
-        date: the date (eg. "2024-12-01")
+        Get the ee.ImageCollection of a data source filtered over a given area
+        and for the cloud coverage
         area: the area of interest
         source: the data source to use
-        Return the ImageCollection, or None if no images available
+        Return the ImageCollection, or None if the source is not available
         """
-        
+
         # Convert the area of interest to a ee.GeometryRectangle
         area_bounding = area.to_ee_rectangle()
 
@@ -388,33 +542,98 @@ class CordobaDataPreprocessor:
             filter_cloud = \
                 ee.Filter.lt('CLOUD_COVER', self.max_cloud_coverage)
             dataset = dataset.filter(filter_cloud)
-        elif source == CordobaDataSource.DYNAMIC_WORLD:
-            pass
-        else:
-          return None
 
-        # Loop to search a date range around the required date which includes
-        # at least one image
-        shift_day = self.step_search_image
-        date_from = ee.Date(date).advance(-shift_day, "day");
-        date_to = ee.Date(date).advance(shift_day, "day");
-        dataset_range = dataset.filterDate(date_from, date_to)
-        nb_try = 0
-        while dataset_range.size().getInfo() == 0 and nb_try < self.nb_max_step_search:
+        return dataset
+
+    def get_search_shifts(self) -> List[float]:
+        """
+        Return the list of half width in days of the date ranges searched
+        around a date, in the order of search
+        """
+        return [
+            self.step_search_image * (i_step + 1)
+            for i_step in range(self.nb_max_step_search)]
+
+    def get_available_image_counts(self,
+        dates: List[str], area: LongLatBBox,
+        sources: List[CordobaDataSource]) -> dict:
+        """
+        Count the images available around several dates for several sources,
+        in a single request to GEE
+        dates: the dates (eg. ["2024-11-01", "2024-12-01"])
+        area: the area of interest
+        sources: the data sources to use
+        Return a dictionary, key is the data source, value is the list for
+        each date of the list of number of images in each date range (cf
+        get_search_shifts())
+        """
+        shifts = self.get_search_shifts()
+
+        # Build the computation of all the counts on server side
+        counts = {}
+        for source in sources:
+            dataset = self.get_ee_dataset(area, source)
+            if dataset is None:
+                continue
+
+            def count_images(date, dataset=dataset):
+                date = ee.Date(date)
+                return ee.List([
+                    dataset.filterDate(
+                        date.advance(-shift, "day"),
+                        date.advance(shift, "day")).size()
+                    for shift in shifts])
+
+            counts[str(source)] = ee.List(dates).map(count_images)
+
+        # Get all the counts at once
+        counts = ee.Dictionary(counts).getInfo() if len(counts) > 0 else {}
+        return {
+            source: counts.get(str(source), [[0] * len(shifts)] * len(dates))
+            for source in sources}
+
+    def get_search_window(self, date: str, shift: float) -> List[str]:
+        """
+        Return the date range of half width 'shift' days around a date, as
+        two "YYYY-MM-DD" strings
+        date: the date (eg. "2024-12-01")
+        shift: the half width in days
+        """
+        date = datetime.datetime.strptime(date[:10], "%Y-%m-%d")
+        return [
+            (date - datetime.timedelta(days=shift)).strftime("%Y-%m-%d"),
+            (date + datetime.timedelta(days=shift)).strftime("%Y-%m-%d")]
+
+    def search_dataset_range(self, date: str, area: LongLatBBox, source: CordobaDataSource) -> ee.ImageCollection:
+        """
+        Search dates around a given date for which an ee.ImageCollection
+        containing at least one image for a given area
+        date: the date (eg. "2024-12-01")
+        area: the area of interest
+        source: the data source to use
+        Return the ImageCollection, or None if no images available
+        """
+        dataset = self.get_ee_dataset(area, source)
+        if dataset is None:
+            return None
+
+        # Count the images in all the date ranges around the required date at
+        # once, and search locally the smallest one which includes at least
+        # one image
+        shifts = self.get_search_shifts()
+        counts = self.get_available_image_counts([date], area, [source])
+        for shift, count in zip(shifts, counts[source][0]):
+            if count > 0:
+                date_from = ee.Date(date).advance(-shift, "day")
+                date_to = ee.Date(date).advance(shift, "day")
+                return dataset.filterDate(date_from, date_to)
             if self.flag_verbose:
-                print(f"no image in {date_from.format('yyyy-MM-dd', 'UTC').getInfo()} - {date_to.format('yyyy-MM-dd', 'UTC').getInfo()} for {source}")
+                window = self.get_search_window(date, shift)
+                print(f"no image in {window[0]} - {window[1]} for {source}")
                 sys.stdout.flush()
-            shift_day += self.step_search_image
-            date_from = ee.Date(date).advance(-shift_day, "day");
-            date_to = ee.Date(date).advance(shift_day, "day");
-            dataset_range = dataset.filterDate(date_from, date_to)
-            nb_try += 1
-
-        # Return the ImageCollection for the result date range
-        if nb_try >= self.nb_max_step_search:
-            return None
-        else:
-            return dataset_range
+
+        # No image available
+        return None
 
     def get_ee_image(self, date: str, area: LongLatBBox, source: CordobaDataSource) -> ee.Image:
         """
@@ -442,9 +661,10 @@ class CordobaDataPreprocessor:
         # Composite all images into a single one using the median of all values
         # To improve results use a mask to exclude clouds when calculating
         # the median
-        if dataset_range.size().getInfo() > 1:
+        nb_images = dataset_range.size().getInfo()
+        if nb_images > 1:
             if self.flag_verbose:
-                print(f"median composite of {dataset_range.size().getInfo()} images...")
+                print(f"median composite of {nb_images} images...")
                 sys.stdout.flush()
             if self.flag_cloud_filtering:
                 if source == CordobaDataSource.SENTINEL2:
@@ -660,10 +880,11 @@ class CordobaDataPreprocessor:
                         sys.stdout.flush()
                     if self.data_source != CordobaDataSource.DYNAMIC_WORLD:
                         ee_image = self.preprocess_gaussian_blur(ee_image)
-                        ee_image = self.preprocess_ndvi(ee_image)
-                        ee_image = self.preprocess_ndbi(ee_image)
-                        ee_image = self.preprocess_evi(ee_image)
-                        ee_image = self.preprocess_ndmi(ee_image)
+                        if not self.flag_local_indices:
+                            ee_image = self.preprocess_ndvi(ee_image)
+                            ee_image = self.preprocess_ndbi(ee_image)
+                            ee_image = self.preprocess_evi(ee_image)
+                            ee_image = self.preprocess_ndmi(ee_image)
 
                     # Convert the ee.image into a CordobaImage
                     if self.flag_verbose:
@@ -729,73 +950,178 @@ class CordobaDataPreprocessor:
             else:
                 return bands[:5]
 
+    def get_http_session(self) -> requests.Session:
+        """
+        Return the HTTP session shared by the downloads, with a connection
+        pool large enough for the concurrent downloads
+        """
+        if self.http_session is None:
+            self.http_session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=self.nb_download_workers,
+                pool_maxsize=self.nb_download_workers)
+            self.http_session.mount("https://", adapter)
+        return self.http_session
+
+    def plan_download_tiles(self, area: LongLatBBox) -> dict:
+        """
+        Plan the grid of chunks used to download the image data of an area.
+        The area is converted to the mercator projection ("EPSG:3395") and
+        snapped to a grid of pixels of the current resolution, then split into
+        chunks of downloadable size (cf max_area_angle).
+        area: the requested area as a LongLatBBox
+        Return a dictionary with the dimensions in pixels of the whole image
+        ("width", "height"), the mercator coordinates of its top left corner
+        ("origin") and the list of chunks as (row, col, height, width) tuples
+        in pixels ("tiles")
+        """
+        x_min, x_max, y_min, y_max = area.to_mercator()
+
+        # Snap the area to the pixel grid
+        origin_x = math.floor(x_min / self.resolution) * self.resolution
+        origin_y = math.ceil(y_max / self.resolution) * self.resolution
+        width = max(1, math.ceil((x_max - origin_x) / self.resolution))
+        height = max(1, math.ceil((origin_y - y_min) / self.resolution))
+
+        # Max size in pixels of a chunk, equivalent to max_area_angle
+        # at 30m/px (one degree = 111111.1 meters approx.)
+        tile_size = max(1, int(self.max_area_angle / 30.0 * 111111.1))
+
+        # Split the image into chunks
+        nb_rows = math.ceil(height / tile_size)
+        nb_cols = math.ceil(width / tile_size)
+        tiles = []
+        for i_row in range(nb_rows):
+            row_from = i_row * height // nb_rows
+            row_to = (i_row + 1) * height // nb_rows
+            for i_col in range(nb_cols):
+                col_from = i_col * width // nb_cols
+                col_to = (i_col + 1) * width // nb_cols
+                tiles.append(
+                    (row_from, col_from, row_to - row_from, col_to - col_from))
+
+        return {
+            "width": width,
+            "height": height,
+            "origin": (origin_x, origin_y),
+            "tiles": tiles}
+
+    def download_tile(self,
+        ee_image: ee.Image, bands_name: List[str],
+        origin: tuple, tile: tuple, image_key: str = None) -> numpy.array:
+        """
+        Download the image data of one chunk as numpy array, or get it from
+        the cache if available.
+        ee_image: the image to download
+        bands_name: the bands to download
+        origin: mercator coordinates of the top left corner of the whole image
+        tile: the chunk as (row, col, height, width) in pixels
+        image_key: the serialized ee_image, used to identify the chunk in the
+        cache (cf tile_cache)
+        Return the chunk data as a numpy structured array of shape
+        (height, width)
+        """
+        row, col, height, width = tile
+
+        # Apply a mercator projection ("EPSG:3395") to convert the data
+        # to a 2D array, the transform and dimensions define exactly the
+        # pixels of the chunk in the grid of the whole image
+        crs_transform = [
+            self.resolution, 0, origin[0] + col * self.resolution,
+            0, -self.resolution, origin[1] - row * self.resolution]
+        dimensions = f"{width}x{height}"
+
+        # If the chunk is in the cache, use it
+        cache_key = None
+        if self.tile_cache is not None and image_key is not None:
+            cache_key = self.tile_cache.get_key(
+                image_key, bands_name, crs_transform, dimensions)
+            tile_data = self.tile_cache.get(cache_key)
+            if tile_data is not None:
+                return tile_data
+
+        url = ee_image.getDownloadUrl({
+            'bands': bands_name,
+            'format': 'NPY',
+            'crs': 'EPSG:3395',
+            'crs_transform': crs_transform,
+            'dimensions': dimensions
+        })
+        response = self.get_http_session().get(
+            url, timeout=self.download_timeout)
+        response.raise_for_status()
+        tile_data = numpy.load(io.BytesIO(response.content))
+
+        # Add the chunk to the cache
+        if cache_key is not None:
+            self.tile_cache.put(cache_key, tile_data)
+        return tile_data
+
     def download_numpy_data(self, ee_image: ee.Image, area: LongLatBBox) -> numpy.array:
         """
-        Download the image data as numpy array. Recursively split the area
-        if necessary to be able to download the data.
+        Download the image data as numpy array. Split the area into chunks of
+        downloadable size, download the chunks concurrently and write each of
+        them directly at its place in the result array.
         eeImage: the image to convert
         area: the requested area as a LongLatBBox
-        Return the image data as numpy array for the requested area
-        """
-        long_span = area.long_to - area.long_from
-        lat_span = area.lat_to - area.lat_from
-        threshold_angle = self.max_area_angle / 30.0 * self.resolution
-        if long_span > threshold_angle:
-            area_left = LongLatBBox(
-                area.long_from, area.long_from + long_span / 2,
-                area.lat_from, area.lat_to)
-            area_right = LongLatBBox(
-                area.long_from + long_span / 2, area.long_to,
-                area.lat_from, area.lat_to)
-            chunk_left = self.download_numpy_data(ee_image, area_left)
-            chunk_right = self.download_numpy_data(ee_image, area_right)
-            return numpy.hstack((chunk_left, chunk_right))
-        elif lat_span > threshold_angle:
-            area_up = LongLatBBox(
-                area.long_from, area.long_to,
-                area.lat_from + lat_span / 2, area.lat_to)
-            area_down = LongLatBBox(
-                area.long_from, area.long_to,
-                area.lat_from, area.lat_from + lat_span / 2)
-            chunk_up = self.download_numpy_data(ee_image, area_up)
-            chunk_down = self.download_numpy_data(ee_image, area_down)
-            return numpy.vstack((chunk_up, chunk_down))
-        else:
-            area_bounding = area.to_ee_rectangle()
-            bands_name = self.get_bands_name(True)
+        Return the image data as numpy array for the requested area, or None
+        if the download failed
+        """
+        plan = self.plan_download_tiles(area)
+        bands_name = self.get_bands_name(not self.flag_local_indices)
+        if self.flag_verbose:
+            print(f"download...({area}, {len(plan['tiles'])} chunks)")
+            print(f"bands...({bands_name})")
+            sys.stdout.flush()
+        """
+        # Should work and is cleaner thant getDownloadUrl but, it returns
+        # different geometries for the same area_bounding, give up
+        request = {
+            'expression': ee_image.clipToBoundsAndScale(geometry=area_bounding, scale=self.resolution),
+            'fileFormat': 'NUMPY_NDARRAY',
+            'bandIds': bands_name,
+        }
+        data_bands = ee.data.computePixels(request)
+        """
+
+        # The result array, allocated once the type of the data is known
+        # (i.e. when the first chunk is received)
+        data_bands = None
+
+        executor = ThreadPoolExecutor(max_workers=self.nb_download_workers)
+        try:
+            # The serialized image identifies the chunks in the cache: it
+            # describes the whole computation of the image (data source,
+            # composite date window, cloud filtering, blur, indices,
+            # registration) without interaction with GEE
+            image_key = None
+            if self.tile_cache is not None:
+                image_key = ee_image.serialize()
+
+            futures = {
+                executor.submit(
+                    self.download_tile,
+                    ee_image, bands_name, plan["origin"], tile,
+                    image_key): tile
+                for tile in plan["tiles"]}
+            for future in as_completed(futures):
+                row, col, height, width = futures[future]
+                tile_data = future.result()
+                if data_bands is None:
+                    data_bands = numpy.zeros(
+                        (plan["height"], plan["width"]), tile_data.dtype)
+                height = min(height, tile_data.shape[0])
+                width = min(width, tile_data.shape[1])
+                data_bands[row:row + height, col:col + width] = \
+                    tile_data[:height, :width]
+        except Exception as exc:
             if self.flag_verbose:
-                print(f"download...({area})")
-                print(f"bands...({bands_name})")
+                print(f"Image data download failed...\n{exc}")
                 sys.stdout.flush()
-            """
-            # Should work and is cleaner thant getDownloadUrl but, it returns
-            # different geometries for the same area_bounding, give up
-            request = {
-                'expression': ee_image.clipToBoundsAndScale(geometry=area_bounding, scale=self.resolution),
-                'fileFormat': 'NUMPY_NDARRAY',
-                'bandIds': bands_name,
-            }
-            data_bands = ee.data.computePixels(request)
-            """
-            try:
-                # Apply a mercator projection ("EPSG:3395") to convert the data
-                # to a 2D array
-                # (it's possible to also get GeoTIFF format here)
-                url = ee_image.getDownloadUrl({
-                    'bands': bands_name,
-                    'region': area_bounding,
-                    'format': 'NPY',
-                    'crs': ee.Projection("EPSG:3395"),
-                    'scale': self.resolution
-                })
-                response = requests.get(url)
-                data_bands = numpy.load(io.BytesIO(response.content))
-            except Exception as exc:
-                if self.flag_verbose:
-                    print(f"Image data download failed...\n{exc}")
-                    sys.stdout.flush()
-                return None
-            return data_bands
+            return None
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return data_bands
 
     def cvt_ee_image_to_cordoba_image(self,
         date: str, ee_image: ee.Image, area: LongLatBBox) -> CordobaImage:
@@ -830,13 +1156,21 @@ class CordobaDataPreprocessor:
         image = CordobaImage(acquisition_date, area, self.resolution, nb_col, nb_row)
 
         # Split the numpy array per band
-        bands_name = self.get_bands_name(True)
+        bands_name = self.get_bands_name(not self.flag_local_indices)
         for band_idx in range(len(bands_name)):
             image.bands[bands_name[band_idx]] = \
                 data_bands[:, :][bands_name[band_idx]]
             #    data_bands[bands_name[band_idx]][:, :]
 
         if self.data_source != CordobaDataSource.DYNAMIC_WORLD:
+            # Calculate the spectral indices locally if they haven't been
+            # calculated on GEE side
+            if self.flag_local_indices:
+                if self.flag_verbose:
+                    print("local spectral indices...")
+                    sys.stdout.flush()
+                image.add_indices(self.get_bands_name(True)[5:])
+
             # Set the mean ndvi of the image
             if self.flag_verbose:
                 print("compute mean ndvi...")
@@ -1004,20 +1338,23 @@ class CordobaDataPreprocessor:
         # If in online mode
         if self.online is True:
 
+            # Get the number of images available around each candidate date
+            # for each data source in a single request
+            sources = [CordobaDataSource.SENTINEL2, CordobaDataSource.LANDSAT8, CordobaDataSource.LANDSAT5]
+            counts = \
+                self.get_available_image_counts(candidate_dates, area, sources)
+
             # Loop on the candidates
-            for candidate_date in candidate_dates:
+            for i_date, candidate_date in enumerate(candidate_dates):
 
                 # Check if there are data for this candidate date in any of
                 # the data source
-                sources = [CordobaDataSource.SENTINEL2, CordobaDataSource.LANDSAT8, CordobaDataSource.LANDSAT5]
-                idx_source = 0
-                dataset_range = None
-                while dataset_range is None and idx_source < len(sources):
-                    dataset_range = self.search_dataset_range(candidate_date, area, sources[idx_source])
-                    idx_source += 1
+                available = any(
+                    max(counts[source][i_date], default=0) > 0
+                    for source in sources)
 
                 # If there was no data available for this range
-                if dataset_range is None:
+                if not available:
                     if self.flag_verbose:
                         print(f"{candidate_date} NG")
                         sys.stdout.flush()
@@ -0,0 +1,209 @@
+import os
+import sys
+import hashlib
+import threading
+from typing import Callable
+import torch
+
+# Keys under which the checkpoints store the weights of the model, if the
+# checkpoint is not the state dictionary itself
+STATE_DICT_KEYS = ("model_state_dict", "model_G_state_dict")
+
+
+class CordobaModelRegistry:
+    """
+    Class implementing a process-wide registry of the prediction models.
+    Each model is loaded once per process, keyed by its architecture and the
+    hash of its weights, and the same eval-mode instance is shared by all the
+    predictions.
+    """
+
+    def __init__(self):
+        """
+        Constructor for an instance of CordobaModelRegistry
+        """
+        # Loaded models, dictionary key is (architecture, weights hash),
+        # dictionary value is the model
+        self.models = {}
+
+        # Hash of the weights files, dictionary key is the path, dictionary
+        # value is (modification time, size, hash), to avoid hashing the
+        # same file again while it is unchanged
+        self.weights_hashes = {}
+
+        # Lock to avoid loading the same model twice from several threads
+        self.lock = threading.Lock()
+
+        # Verbose mode
+        self.flag_verbose = True
+
+    def get_weights_hash(self, weights_path: str) -> str:
+        """
+        Get the hash of a weights file
+        weights_path: path to the weights file
+        Return the SHA-256 of the file as an hexadecimal string
+        """
+        stat = os.stat(weights_path)
+        cached = self.weights_hashes.get(weights_path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        hash_weights = hashlib.sha256()
+        with open(weights_path, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                hash_weights.update(chunk)
+        weights_hash = hash_weights.hexdigest()
+        self.weights_hashes[weights_path] = \
+            (stat.st_mtime_ns, stat.st_size, weights_hash)
+        return weights_hash
+
+    def load_model(self,
+        build: Callable[[], torch.nn.Module],
+        weights_path: str) -> torch.nn.Module:
+        """
+        Create a model and load its weights
+        build: function creating the model
+        weights_path: path to the weights file
+        Return the model on CPU in eval mode
+        """
+        model = build()
+        pretrained_dict = torch.load(
+            weights_path, map_location="cpu", weights_only=True)
+        for key in STATE_DICT_KEYS:
+            if key in pretrained_dict:
+                pretrained_dict = pretrained_dict[key]
+                break
+
+        # Remove the prefix added to the weights by DataParallel
+        module_model_state_dict = {}
+        for item, value in pretrained_dict.items():
+            if item[:7] == 'module.':
+                item = item[7:]
+            module_model_state_dict[item] = value
+        model.load_state_dict(module_model_state_dict, strict=True)
+        model.cpu()
+        model.eval()
+        return model
+
+    def get_cached_model(self,
+        key: tuple,
+        load: Callable[[], object],
+        description: str) -> object:
+        """
+        Get a model, loading it if it's not in the registry yet
+        key: the key of the model in the registry
+        load: function loading the model
+        description: description of the model for the verbose mode
+        Return the model
+        """
+        model = self.models.get(key)
+        if model is not None:
+            return model
+
+        with self.lock:
+            # The model may have been loaded by another thread meanwhile
+            model = self.models.get(key)
+            if model is None:
+                if self.flag_verbose:
+                    print(f"loading model {description}...")
+                    sys.stdout.flush()
+                model = load()
+                self.models[key] = model
+                if self.flag_verbose:
+                    print(f"model memory: {self.get_model_memory(model) / 1024 ** 2:.1f}MB, registry memory: {self.get_memory_usage() / 1024 ** 2:.1f}MB")
+                    sys.stdout.flush()
+        return model
+
+    def get_model(self,
+        architecture: str,
+        build: Callable[[], torch.nn.Module],
+        weights_path: str,
+        warm_up_inputs: Callable[[], object] = None) -> torch.nn.Module:
+        """
+        Get a PyTorch model, loading it if it's not in the registry yet
+        architecture: name of the architecture and its parameters (eg.
+        "FCCDN(num_band=3,use_se=True)")
+        build: function creating the model
+        weights_path: path to the weights file
+        warm_up_inputs: optional function creating inputs for a first
+        forward pass when the model is loaded
+        Return the model on CPU in eval mode
+        """
+        def load():
+            model = self.load_model(build, weights_path)
+            if warm_up_inputs is not None:
+                self.warm_up(model, warm_up_inputs())
+            return model
+        key = (architecture, self.get_weights_hash(weights_path))
+        return self.get_cached_model(key, load, f"{architecture} ({weights_path})")
+
+    def get_onnx_model(self,
+        onnx_path: str,
+        intra_op_threads: int = None,
+        inter_op_threads: int = 1,
+        warm_up_inputs: Callable[[], list] = None) -> "CordobaOnnxModel":
+        """
+        Get a network exported to ONNX, loading it if it's not in the
+        registry yet
+        onnx_path: path to the ONNX file
+        intra_op_threads: cf cordobaOnnx.get_session_options
+        inter_op_threads: cf cordobaOnnx.get_session_options
+        warm_up_inputs: optional function creating the list of inputs for a
+        first run when the model is loaded
+        Return the model as a CordobaOnnxModel
+        """
+        from cordobaOnnx import CordobaOnnxModel
+        def load():
+            model = CordobaOnnxModel(onnx_path, intra_op_threads, inter_op_threads)
+            if warm_up_inputs is not None:
+                model(*warm_up_inputs())
+            return model
+        architecture = f"onnx(intra={intra_op_threads},inter={inter_op_threads})"
+        key = (architecture, self.get_weights_hash(onnx_path))
+        return self.get_cached_model(key, load, f"{architecture} ({onnx_path})")
+
+    def warm_up(self, model: torch.nn.Module, inputs: object):
+        """
+        Run a forward pass to initialise the model lazy allocations
+        model: the model
+        inputs: the inputs of the forward pass
+        """
+        with torch.inference_mode():
+            model(inputs)
+
+    def get_model_memory(self, model: object) -> int:
+        """
+        Return the memory used by the parameters and buffers of a model, in
+        bytes
+        model: the model
+        """
+        if not isinstance(model, torch.nn.Module):
+            return model.get_memory()
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+    def get_memory_usage(self) -> int:
+        """
+        Return the memory used by all the models in the registry, in bytes
+        """
+        return sum(
+            self.get_model_memory(model) for model in self.models.values())
+
+    def get_memory_report(self) -> dict:
+        """
+        Return the memory used by each model in the registry, as a
+        dictionary of architecture and weights hash to bytes
+        """
+        return {
+            f"{architecture}@{weights_hash[:12]}": self.get_model_memory(model)
+            for (architecture, weights_hash), model in self.models.items()}
+
+    def clear(self):
+        """
+        Remove all the models from the registry
+        """
+        with self.lock:
+            self.models = {}
+
+
+# Registry shared by all the predictors of the process
+model_registry = CordobaModelRegistry()
@@ -0,0 +1,255 @@
+import os
+import sys
+import argparse
+from typing import List
+import numpy
+import torch
+from cordobaModelRegistry import *
+
+
+class CordobaPairModel(torch.nn.Module):
+    """
+    Class wrapping a change detection network taking the pair of images as a
+    list and returning a list of outputs (like FCCDN) into a network taking
+    the two images as separate inputs and returning the logits, as required
+    for the ONNX export and the tiled inference.
+    """
+
+    def __init__(self, model: torch.nn.Module):
+        """
+        Constructor for an instance of CordobaPairModel
+        model: the wrapped network
+        """
+        super().__init__()
+        self.model = model
+
+    def forward(self, pre: torch.Tensor, post: torch.Tensor) -> torch.Tensor:
+        return self.model([pre, post])[0]
+
+
+def build_fccdn() -> torch.nn.Module:
+    """
+    Create the FCCDN network. Expect a folder 'FCCDN' containing a subfolder
+    'networks' containing the FCCDN network definition.
+    """
+    from FCCDN.networks.FCCDN import FCCDN
+    return FCCDN(num_band=3, use_se=True)
+
+
+def build_bit_cd() -> torch.nn.Module:
+    """
+    Create the BIT_CD network (BASE_Transformer, configuration
+    'base_transformer_pos_s4_dd8_dedim8'). Expect a folder 'BIT_CD'
+    containing the BIT_CD sources.
+    """
+    if "./BIT_CD" not in sys.path:
+        sys.path.append("./BIT_CD")
+    from models.networks import BASE_Transformer
+    return BASE_Transformer(
+        input_nc=3, output_nc=2, token_len=4, resnet_stages_num=4,
+        with_pos='learned', enc_depth=1, dec_depth=8, decoder_dim_head=8)
+
+
+def build_unet() -> torch.nn.Module:
+    """
+    Create the land cover UNet network. Expect a folder 'unet' containing
+    the UNet network definition.
+    """
+    from unet import UNet
+    return UNet(n_channels=3, n_classes=7)
+
+
+# Networks which can be exported, dictionary key is the name of the network,
+# dictionary value is the function creating it, the names of its inputs, the
+# size of the windows it processes, the multiple its inputs size must be, and
+# the normalisation of its inputs (RGB values in [0,1])
+ONNX_ARCHITECTURES = {
+    "fccdn": {
+        "build": build_fccdn,
+        "inputs": ["pre", "post"],
+        "tile_size": 1024,
+        "size_multiple": 64,
+        "mean": [0.37772245912313807, 0.4425350597897193, 0.4464795300397427],
+        "std": [0.1762166286060892, 0.1917139949806914, 0.20443966020731438],
+    },
+    "bit_cd": {
+        "build": build_bit_cd,
+        "inputs": ["pre", "post"],
+        "tile_size": 256,
+        "size_multiple": 32,
+        "mean": [0.5, 0.5, 0.5],
+        "std": [0.5, 0.5, 0.5],
+    },
+    "unet": {
+        "build": build_unet,
+        "inputs": ["image"],
+        "tile_size": 512,
+        "size_multiple": 16,
+        "mean": [0.0, 0.0, 0.0],
+        "std": [1.0, 1.0, 1.0],
+    },
+}
+
+
+def load_architecture(architecture: str, weights_path: str) -> torch.nn.Module:
+    """
+    Load a network ready for export
+    architecture: the name of the network, one of ONNX_ARCHITECTURES
+    weights_path: path to the weights file
+    Return the network in eval mode, taking one tensor per input image and
+    returning the logits
+    """
+    build = ONNX_ARCHITECTURES[architecture]["build"]
+    model = model_registry.load_model(build, weights_path)
+    if architecture == "fccdn":
+        model = CordobaPairModel(model).eval()
+    return model
+
+
+def export_onnx(
+    model: torch.nn.Module,
+    path: str,
+    input_names: List[str],
+    size: int,
+    opset: int = 17):
+    """
+    Export a network to an ONNX graph with dynamic batch and tile dimensions
+    model: the network, taking one tensor (batch, 3, height, width) per
+    input image and returning the logits
+    path: path of the ONNX file
+    input_names: the names of the inputs of the network
+    size: the size of the example inputs used to trace the network
+    opset: the ONNX opset version (default: 17)
+    """
+    example_inputs = tuple(torch.zeros(1, 3, size, size) for _ in input_names)
+    dynamic_axes = {
+        name: {0: "batch", 2: "height", 3: "width"}
+        for name in input_names + ["logits"]}
+    with torch.inference_mode():
+        torch.onnx.export(
+            model, example_inputs, path,
+            input_names=input_names, output_names=["logits"],
+            dynamic_axes=dynamic_axes, opset_version=opset, dynamo=False)
+
+
+def get_session_options(
+    intra_op_threads: int = None,
+    inter_op_threads: int = 1) -> "onnxruntime.SessionOptions":
+    """
+    Create the options of an ONNX Runtime session
+    intra_op_threads: number of threads used inside an operator (default:
+    the number of CPUs available to the process)
+    inter_op_threads: number of threads used to run independent operators
+    in parallel (default: 1, the graphs of our networks are mostly
+    sequential)
+    Return the session options
+    """
+    import onnxruntime
+    if intra_op_threads is None:
+        intra_op_threads = len(os.sched_getaffinity(0)) \
+            if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = \
+        onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return options
+
+
+class CordobaOnnxModel:
+    """
+    Class implementing the execution of an exported network with ONNX
+    Runtime on CPU. Instances are called like the PyTorch network, with one
+    tensor per input image, and return the logits as a tensor, so they can
+    be used as the forward function of CordobaTiledInference.
+    """
+
+    def __init__(self,
+        path: str,
+        intra_op_threads: int = None,
+        inter_op_threads: int = 1):
+        """
+        Constructor for an instance of CordobaOnnxModel
+        path: path of the ONNX file
+        intra_op_threads: cf get_session_options
+        inter_op_threads: cf get_session_options
+        """
+        import onnxruntime
+        self.path = path
+        self.session = onnxruntime.InferenceSession(
+            path,
+            sess_options=get_session_options(intra_op_threads, inter_op_threads),
+            providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def __call__(self, *inputs: torch.Tensor) -> torch.Tensor:
+        """
+        Run the network
+        inputs: one tensor (batch, channels, height, width) per input image
+        Return the logits as a tensor
+        """
+        feed = {
+            name: numpy.ascontiguousarray(tensor.numpy(), dtype=numpy.float32)
+            for name, tensor in zip(self.input_names, inputs)}
+        return torch.from_numpy(self.session.run(None, feed)[0])
+
+    def get_memory(self) -> int:
+        """
+        Return the size of the ONNX graph and its weights, in bytes
+        """
+        return os.path.getsize(self.path)
+
+
+def check_onnx_parity(
+    model: torch.nn.Module,
+    onnx_model: CordobaOnnxModel,
+    size: int,
+    batch_size: int = 2,
+    atol: float = 1e-3,
+    rtol: float = 1e-3) -> float:
+    """
+    Compare the outputs of an exported network with the PyTorch network on
+    random inputs, with a batch size and a tile size different from the ones
+    used for the export to check the dynamic dimensions
+    model: the PyTorch network
+    onnx_model: the exported network
+    size: the size of the inputs
+    batch_size: the batch size of the inputs (default: 2)
+    atol: absolute tolerance (default: 1e-3)
+    rtol: relative tolerance (default: 1e-3)
+    Return the maximum absolute difference between the outputs, raise
+    ValueError if the outputs differ more than the tolerance
+    """
+    generator = torch.Generator().manual_seed(0)
+    inputs = [
+        torch.randn(batch_size, 3, size, size, generator=generator)
+        for _ in onnx_model.input_names]
+    with torch.inference_mode():
+        expected = model(*inputs)
+    result = onnx_model(*inputs)
+    max_diff = (result - expected).abs().max().item()
+    if not torch.allclose(result, expected, atol=atol, rtol=rtol):
+        raise ValueError(f"ONNX outputs differ from PyTorch outputs (max abs diff {max_diff})")
+    return max_diff
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export a network to ONNX and check the parity with PyTorch")
+    parser.add_argument("architecture", choices=list(ONNX_ARCHITECTURES))
+    parser.add_argument("weights", help="path to the PyTorch weights file")
+    parser.add_argument("output", help="path to the ONNX file")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--check_size", type=int, default=None,
+        help="size of the inputs for the parity check (default: half the tile size)")
+    args = parser.parse_args()
+
+    spec = ONNX_ARCHITECTURES[args.architecture]
+    model = load_architecture(args.architecture, args.weights)
+    export_onnx(model, args.output, spec["inputs"], spec["tile_size"], args.opset)
+    print(f"exported {args.architecture} to {args.output}")
+
+    check_size = args.check_size or spec["tile_size"] // 2
+    max_diff = check_onnx_parity(model, CordobaOnnxModel(args.output), check_size)
+    print(f"parity check passed (max abs diff {max_diff:.2e})")
@@ -1,5 +1,6 @@
 from cordobaDataPreprocessor import *
 import numpy
+from typing import Callable
 from sklearn.decomposition import PCA
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
@@ -10,6 +11,83 @@ import cv2
 # Expect a folder 'FCCDN' containing the weights and a subfolder 'networks'
 # containing the FCCDN network definition
 from FCCDN.networks.FCCDN import FCCDN
+from cordobaModelRegistry import *
+from cordobaTiledInference import *
+from cordobaOnnx import *
+from cordobaQuantization import get_quantized_path
+
+# Weights of the FCCDN model
+FCCDN_WEIGHTS = "./FCCDN/FCCDN_test_LEVIR_CD.pth"
+
+# FCCDN model exported to ONNX (cf cordobaOnnx.py)
+FCCDN_ONNX = "./FCCDN/FCCDN_test_LEVIR_CD.onnx"
+
+# Size of the inputs the FCCDN model was trained on, used as default size of
+# the windows for tiled inference
+FCCDN_INPUT_SIZE = 1024
+
+# The size of the inputs of the FCCDN model must be a multiple of this value
+FCCDN_SIZE_MULTIPLE = 64
+
+
+def get_fccdn_model(flag_warm_up: bool = True) -> torch.nn.Module:
+    """
+    Get the FCCDN model from the process-wide registry, loading it on the
+    first call
+    flag_warm_up: if True, run a forward pass on blank inputs when the model
+    is loaded
+    Return the model on CPU in eval mode
+    """
+    warm_up_inputs = None
+    if flag_warm_up:
+        def warm_up_inputs():
+            blank = torch.zeros(1, 3, FCCDN_INPUT_SIZE, FCCDN_INPUT_SIZE)
+            return [blank, blank]
+    return model_registry.get_model(
+        "FCCDN(num_band=3,use_se=True)",
+        lambda: FCCDN(num_band=3, use_se=True),
+        FCCDN_WEIGHTS,
+        warm_up_inputs)
+
+
+def get_fccdn_onnx_model(
+    quantization: str = None,
+    intra_op_threads: int = None,
+    inter_op_threads: int = 1,
+    flag_warm_up: bool = True) -> CordobaOnnxModel:
+    """
+    Get the FCCDN model exported to ONNX from the process-wide registry,
+    loading it on the first call
+    quantization: None for the fp32 model, or the mode of the INT8 variant
+    (cf cordobaQuantization.QUANTIZATION_MODES)
+    intra_op_threads: cf cordobaOnnx.get_session_options
+    inter_op_threads: cf cordobaOnnx.get_session_options
+    flag_warm_up: if True, run the model on blank inputs when it is loaded
+    Return the model as a CordobaOnnxModel
+    """
+    warm_up_inputs = None
+    if flag_warm_up:
+        def warm_up_inputs():
+            blank = torch.zeros(1, 3, FCCDN_INPUT_SIZE, FCCDN_INPUT_SIZE)
+            return [blank, blank]
+    onnx_path = FCCDN_ONNX
+    if quantization is not None:
+        onnx_path = get_quantized_path(FCCDN_ONNX, quantization)
+    return model_registry.get_onnx_model(
+        onnx_path, intra_op_threads, inter_op_threads, warm_up_inputs)
+
+
+def warm_up_worker(**kwargs):
+    """
+    Load and warm up the models when a worker process starts, so that the
+    first request doesn't pay for the deserialisation of the weights. Meant
+    to be connected to Celery's worker_process_init signal:
+        from celery.signals import worker_process_init
+        worker_process_init.connect(warm_up_worker)
+    kwargs: the signal arguments (unused)
+    """
+    CordobaPredictor().get_fccdn_forward()
+
 
 class CordobaPredictor:
     """
@@ -20,7 +98,47 @@ class CordobaPredictor:
         """
         Constructor for an instance of CordobaPredictor
         """
-        pass
+        # Size in pixels of the windows for the tiled inference of the
+        # neural networks
+        self.tile_size = FCCDN_INPUT_SIZE
+
+        # Size in pixels of the overlap between windows
+        self.tile_overlap = 128
+
+        # Number of windows processed together
+        self.batch_size = 2
+
+        # Execution backend of the neural networks, "torch" (PyTorch) or
+        # "onnx" (ONNX Runtime, requires the networks exported with
+        # cordobaOnnx.py)
+        self.backend = "torch"
+
+        # Number of threads of the ONNX Runtime backend (cf
+        # cordobaOnnx.get_session_options)
+        self.onnx_intra_op_threads = None
+        self.onnx_inter_op_threads = 1
+
+        # INT8 variant of the networks used by the ONNX Runtime backend, None
+        # (fp32), "dynamic" or "static" (requires the variants created with
+        # cordobaQuantization.py)
+        self.quantization = None
+
+    def get_fccdn_forward(self) -> Callable[[torch.Tensor, torch.Tensor], torch.Tensor]:
+        """
+        Get the FCCDN model for the current backend
+        Return a function taking the batches of pre and post images and
+        returning the logits
+        """
+        if self.backend == "torch":
+            if self.quantization is not None:
+                raise ValueError("Quantized networks require the onnx backend")
+            model = get_fccdn_model()
+            return lambda pre, post: model([pre, post])[0]
+        elif self.backend == "onnx":
+            return get_fccdn_onnx_model(
+                self.quantization,
+                self.onnx_intra_op_threads, self.onnx_inter_op_threads)
+        raise ValueError(f"Unknown backend {self.backend}")
 
     def predictPcaKMeanClustering(self, images: List[CordobaImage]) -> numpy.array:
         """
@@ -62,44 +180,30 @@ class CordobaPredictor:
         Return the predicted mask as a numpy array (white is changed area)
         """
 
-        # Paths and model setup
-        pretrained_weights = "./FCCDN/FCCDN_test_LEVIR_CD.pth"
-
-        # Load model
-        model = FCCDN(num_band=3, use_se=True)
-        pretrained_dict = torch.load(pretrained_weights, map_location="cpu", weights_only=True)
-        module_model_state_dict = {}
-        for item, value in pretrained_dict['model_state_dict'].items():
-            if item[:7] == 'module.':
-                item = item[7:]
-            module_model_state_dict[item] = value
-        model.load_state_dict(module_model_state_dict, strict=True)
-        model.cpu()
-        model.eval()
+        # Get the model (loaded once per process)
+        forward = self.get_fccdn_forward()
 
         # Normalization transform
         mean_value = [0.37772245912313807, 0.4425350597897193, 0.4464795300397427]
         std_value = [0.1762166286060892, 0.1917139949806914, 0.20443966020731438]
         normalize = T.Normalize(mean=mean_value, std=std_value)
 
-        # Input images (needs to be 1024x1024 for FCCDN)
-        pre = images[0].to_rgb()
-        original_shape = pre.shape
-        pre = cv2.resize(pre, (1024, 1024)) 
-        post = images[1].to_rgb()
-        post = cv2.resize(post, (1024, 1024)) 
-        
-        # Normalize and convert to tensor
-        pre = normalize(torch.Tensor(pre.transpose(2, 0, 1) / 255))[None].cpu()
-        post = normalize(torch.Tensor(post.transpose(2, 0, 1) / 255))[None].cpu()
+        # Input images, normalized and converted to tensor, at full resolution
+        pre = normalize(torch.from_numpy(images[0].to_rgb().transpose(2, 0, 1) / 255).float())
+        post = normalize(torch.from_numpy(images[1].to_rgb().transpose(2, 0, 1) / 255).float())
 
-        # Model prediction
-        pred = model([pre, post])
+        # Model prediction, per overlapping windows
+        tiled_inference = CordobaTiledInference(
+            forward,
+            tile_size=self.tile_size,
+            overlap=self.tile_overlap,
+            batch_size=self.batch_size,
+            size_multiple=FCCDN_SIZE_MULTIPLE)
+        logits = tiled_inference.predict([pre, post])
 
         # Process outputs
-        out = torch.round(torch.sigmoid(pred[0])).cpu().detach().numpy()
-        out = (out[0, 0] * 255).astype(numpy.uint8)
-        out = cv2.resize(out, [original_shape[1], original_shape[0]])
+        out = (logits[0] > 0).numpy()
+        out = out.astype(numpy.uint8) * 255
         return out
 
     def predictChangeVectorAnalysis(self, images: List[CordobaImage]) -> numpy.array:
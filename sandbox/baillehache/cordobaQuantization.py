@@ -0,0 +1,420 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+import numpy
+import torch
+import cv2
+from sklearn.metrics import f1_score, jaccard_score
+from cordobaOnnx import *
+from cordobaTiledInference import *
+
+# Available quantization modes: "dynamic" (weights quantized offline,
+# activations quantized on the fly) and "static" (weights and activations
+# quantized offline, using ranges of activations measured on a calibration
+# set)
+QUANTIZATION_MODES = ("dynamic", "static")
+
+
+def get_quantized_path(onnx_path: str, mode: str) -> str:
+    """
+    Return the path of the quantized variant of an ONNX file
+    onnx_path: path of the fp32 ONNX file
+    mode: the quantization mode, one of QUANTIZATION_MODES
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode {mode}")
+    root, ext = os.path.splitext(onnx_path)
+    return f"{root}.int8-{mode}{ext}"
+
+
+def list_images(path: str, nb_inputs: int) -> List[dict]:
+    """
+    List the images of a dataset. The dataset is a folder containing the
+    subfolders 't1' (and 't2' for change detection), and optionally 'gt'
+    for the ground truth, with the same file names in each subfolder (like
+    FCCDN/test_data).
+    path: path to the dataset
+    nb_inputs: number of input images per sample (2 for change detection)
+    Return the list of samples as dictionaries with keys 'inputs' (list of
+    paths) and 'gt' (path or None)
+    """
+    folders = ["t1", "t2"][:nb_inputs]
+    samples = []
+    for file_name in sorted(os.listdir(os.path.join(path, "t1"))):
+        inputs = [os.path.join(path, folder, file_name) for folder in folders]
+        if not all(os.path.isfile(input_path) for input_path in inputs):
+            print(f"Missing corresponding file for {file_name}")
+            continue
+        gt_path = os.path.join(path, "gt", file_name)
+        samples.append({
+            "inputs": inputs,
+            "gt": gt_path if os.path.isfile(gt_path) else None,
+        })
+    return samples
+
+
+def load_image(path: str, mean: List[float], std: List[float]) -> torch.Tensor:
+    """
+    Load an RGB image and normalise it
+    path: path to the image file
+    mean, std: normalisation of the RGB values in [0,1]
+    Return the image as a tensor (3, height, width)
+    """
+    image = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+    image = torch.from_numpy(image.transpose(2, 0, 1) / 255).float()
+    mean = torch.tensor(mean)[:, None, None]
+    std = torch.tensor(std)[:, None, None]
+    return (image - mean) / std
+
+
+def get_prediction(logits: torch.Tensor) -> numpy.array:
+    """
+    Convert the logits of a network into its prediction
+    logits: the logits as a tensor (nb_out_channels, height, width)
+    Return the predicted class of each pixel as a numpy array (height, width)
+    (for binary change detection, 1 is changed area)
+    """
+    if logits.shape[0] == 1:
+        return (logits[0] > 0).numpy().astype(numpy.uint8)
+    return logits.argmax(dim=0).numpy().astype(numpy.uint8)
+
+
+class CordobaCalibrationReader:
+    """
+    Class implementing the calibration data reader for the static
+    quantization with ONNX Runtime (same interface as
+    onnxruntime.quantization.CalibrationDataReader). Provides windows cut
+    from the images of a dataset of our own tiles.
+    """
+
+    def __init__(self,
+        architecture: str,
+        input_names: List[str],
+        path: str,
+        nb_samples: int = 32,
+        size: int = 256):
+        """
+        Constructor for an instance of CordobaCalibrationReader
+        architecture: the name of the network, one of ONNX_ARCHITECTURES
+        input_names: the names of the inputs of the ONNX graph
+        path: path to the calibration dataset (cf list_images)
+        nb_samples: maximum number of samples used for calibration
+        size: maximum size of the windows cut from the images (the
+        calibration keeps all the intermediate tensors of a window in
+        memory, full tiles would need several GB)
+        """
+        self.spec = ONNX_ARCHITECTURES[architecture]
+        self.size = size
+        self.input_names = input_names
+        self.samples = list_images(path, len(input_names))[:nb_samples]
+        self.i_sample = 0
+        self.end_sample = len(self.samples)
+        if len(self.samples) == 0:
+            raise ValueError(f"No calibration images in {path}")
+
+    def get_next(self) -> dict:
+        """
+        Return the inputs of the next sample, as a dictionary of input name
+        to numpy array (1, 3, height, width), or None if there are no more
+        samples
+        """
+        if self.i_sample >= self.end_sample:
+            return None
+        sample = self.samples[self.i_sample]
+        self.i_sample += 1
+
+        # Crop the center of the images to a valid window size
+        images = [
+            load_image(input_path, self.spec["mean"], self.spec["std"])
+            for input_path in sample["inputs"]]
+        crop = []
+        for length in images[0].shape[1:]:
+            size = min(self.size, length)
+            size -= size % self.spec["size_multiple"]
+            start = (length - size) // 2
+            crop.append(slice(start, start + size))
+        return {
+            name: image[None, :, crop[0], crop[1]].numpy()
+            for name, image in zip(self.input_names, images)}
+
+    def __len__(self) -> int:
+        """
+        Return the number of samples
+        """
+        return len(self.samples)
+
+    def set_range(self, start_index: int, end_index: int):
+        """
+        Restrict the next samples to a range, used by ONNX Runtime to
+        calibrate by chunks of samples
+        start_index: index of the first sample
+        end_index: index after the last sample
+        """
+        self.i_sample = start_index
+        self.end_sample = min(end_index, len(self.samples))
+
+    def rewind(self):
+        """
+        Restart from the first sample
+        """
+        self.i_sample = 0
+        self.end_sample = len(self.samples)
+
+
+def quantize_model(
+    architecture: str,
+    onnx_path: str,
+    mode: str,
+    calibration_path: str = None,
+    nb_calibration: int = 32,
+    calibration_size: int = 256) -> str:
+    """
+    Create the INT8 variant of an exported network
+    architecture: the name of the network, one of ONNX_ARCHITECTURES
+    onnx_path: path of the fp32 ONNX file
+    mode: the quantization mode, one of QUANTIZATION_MODES
+    calibration_path: path to the calibration dataset (cf list_images),
+    required for static quantization
+    nb_calibration: maximum number of calibration samples
+    calibration_size: maximum size of the calibration windows
+    Return the path of the quantized ONNX file (cf get_quantized_path)
+    """
+    from onnxruntime.quantization import (
+        quantize_dynamic, quantize_static, quant_pre_process,
+        QuantFormat, QuantType)
+    output_path = get_quantized_path(onnx_path, mode)
+    if mode == "static" and calibration_path is None:
+        raise ValueError("Static quantization requires a calibration dataset")
+
+    # Infer the shapes and fold the constants before quantization (the
+    # weights shared by the two branches of the change detection networks
+    # are exported behind Identity nodes, which the quantizer doesn't
+    # handle)
+    preprocessed_path = f"{output_path}.preprocessed.onnx"
+    quant_pre_process(onnx_path, preprocessed_path, skip_symbolic_shape=True)
+    try:
+        if mode == "dynamic":
+            quantize_dynamic(
+                preprocessed_path, output_path, per_channel=True,
+                weight_type=QuantType.QInt8)
+        else:
+            input_names = ONNX_ARCHITECTURES[architecture]["inputs"]
+            reader = CordobaCalibrationReader(
+                architecture, input_names, calibration_path, nb_calibration,
+                calibration_size)
+            # Calibrate sample by sample, merging the ranges after each
+            # sample, to bound the memory used
+            quantize_static(
+                preprocessed_path, output_path, reader,
+                quant_format=QuantFormat.QDQ, per_channel=True,
+                activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                extra_options={"CalibStridedMinMax": 1})
+    finally:
+        os.remove(preprocessed_path)
+    return output_path
+
+
+def evaluate_model(
+    model: CordobaOnnxModel,
+    architecture: str,
+    eval_path: str,
+    references: List[numpy.array] = None) -> dict:
+    """
+    Evaluate the accuracy and speed of an exported network
+    model: the network
+    architecture: the name of the network, one of ONNX_ARCHITECTURES
+    eval_path: path to the evaluation dataset (cf list_images)
+    references: predictions used as ground truth for the samples without
+    ground truth (eg. the predictions of the fp32 network)
+    Return a dictionary with the average F1 score and IoU, the average time
+    per image in seconds and the predictions
+    """
+    spec = ONNX_ARCHITECTURES[architecture]
+    tiled_inference = CordobaTiledInference(
+        model,
+        tile_size=spec["tile_size"],
+        overlap=spec["tile_size"] // 8,
+        batch_size=1,
+        size_multiple=spec["size_multiple"])
+    samples = list_images(eval_path, len(spec["inputs"]))
+    predictions = []
+    f1_scores = []
+    iou_scores = []
+    duration = 0.0
+    for i_sample, sample in enumerate(samples):
+        images = [
+            load_image(input_path, spec["mean"], spec["std"])
+            for input_path in sample["inputs"]]
+        start = time.perf_counter()
+        prediction = get_prediction(tiled_inference.predict(images))
+        duration += time.perf_counter() - start
+        predictions.append(prediction)
+
+        # Compare with the ground truth, or the reference prediction
+        if sample["gt"] is not None:
+            ground_truth = cv2.imread(sample["gt"], cv2.IMREAD_GRAYSCALE)
+            ground_truth = (ground_truth > 127).astype(numpy.uint8)
+        elif references is not None:
+            ground_truth = references[i_sample]
+        else:
+            continue
+        average = "binary" if spec["inputs"] == ["pre", "post"] else "macro"
+        f1_scores.append(f1_score(
+            ground_truth.flatten(), prediction.flatten(),
+            average=average, zero_division=1.0))
+        iou_scores.append(jaccard_score(
+            ground_truth.flatten(), prediction.flatten(),
+            average=average, zero_division=1.0))
+    nb_samples = max(1, len(samples))
+    return {
+        "f1": float(numpy.mean(f1_scores)) if f1_scores else None,
+        "iou": float(numpy.mean(iou_scores)) if iou_scores else None,
+        "seconds_per_image": duration / nb_samples,
+        "predictions": predictions,
+    }
+
+
+def get_peak_memory() -> int:
+    """
+    Return the peak resident memory of the current process in bytes, or None
+    if it can't be measured on this platform
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # In kilobytes on Linux, in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def evaluate_variant(
+    architecture: str,
+    path: str,
+    eval_path: str,
+    references: List[numpy.array],
+    intra_op_threads: int,
+    inter_op_threads: int) -> dict:
+    """
+    Evaluate an exported network in a fresh process (cf evaluate_model), and
+    measure the memory used at runtime by its session: the increase of the
+    peak resident memory of the process during the evaluation
+    Return the evaluation with the size of the ONNX file and the peak memory
+    in bytes (None if it can't be measured)
+    """
+    baseline = get_peak_memory()
+    model = CordobaOnnxModel(path, intra_op_threads, inter_op_threads)
+    result = evaluate_model(model, architecture, eval_path, references)
+    peak = get_peak_memory()
+    result["model_size"] = model.get_memory()
+    result["peak_memory"] = peak - baseline if peak is not None else None
+    return result
+
+
+def create_quantization_report(
+    architecture: str,
+    onnx_path: str,
+    calibration_path: str,
+    eval_path: str,
+    modes: List[str] = QUANTIZATION_MODES,
+    nb_calibration: int = 32,
+    calibration_size: int = 256,
+    intra_op_threads: int = None,
+    inter_op_threads: int = 1) -> dict:
+    """
+    Create the quantized variants of an exported network and compare their
+    accuracy, speed, size and runtime memory with the fp32 network. Each
+    variant is evaluated in its own process so that their peak memories are
+    measured independently
+    architecture: the name of the network, one of ONNX_ARCHITECTURES
+    onnx_path: path of the fp32 ONNX file
+    calibration_path: path to the calibration dataset (cf list_images)
+    eval_path: path to the evaluation dataset (cf list_images)
+    modes: the quantization modes to evaluate
+    nb_calibration: maximum number of calibration samples
+    calibration_size: maximum size of the calibration windows
+    intra_op_threads, inter_op_threads: cf cordobaOnnx.get_session_options
+    Return the report as a dictionary of variant ("fp32" or the quantization
+    mode) to dictionary of path, F1 score, IoU, time per image, size of the
+    ONNX file, peak runtime memory, and agreement with the fp32 predictions
+    """
+    report = {}
+    variants = [("fp32", onnx_path)]
+    for mode in modes:
+        print(f"quantizing {architecture} ({mode})...")
+        sys.stdout.flush()
+        variants.append((mode, quantize_model(
+            architecture, onnx_path, mode, calibration_path, nb_calibration,
+            calibration_size)))
+
+    references = None
+    for variant, path in variants:
+        with ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn")) as executor:
+            result = executor.submit(
+                evaluate_variant, architecture, path, eval_path, references,
+                intra_op_threads, inter_op_threads).result()
+        predictions = result.pop("predictions")
+        if references is None:
+            references = predictions
+        result["path"] = path
+        result["agreement"] = float(numpy.mean([
+            numpy.mean(prediction == reference)
+            for prediction, reference in zip(predictions, references)])) \
+            if predictions else None
+        report[variant] = result
+    return report
+
+
+def print_quantization_report(report: dict):
+    """
+    Display a quantization report on the standard output
+    report: the report (cf create_quantization_report)
+    """
+    def format_value(value, fmt):
+        return "-" if value is None else format(value, fmt)
+    fp32 = report["fp32"]
+    print(f"{'variant':<10}{'F1':>8}{'IoU':>8}{'agree':>8}{'s/img':>10}{'speedup':>9}{'file MB':>10}{'peak MB':>10}")
+    for variant, result in report.items():
+        speedup = fp32["seconds_per_image"] / result["seconds_per_image"] \
+            if result["seconds_per_image"] > 0 else None
+        peak_memory = result["peak_memory"] / 1024 ** 2 \
+            if result["peak_memory"] is not None else None
+        print(
+            f"{variant:<10}"
+            f"{format_value(result['f1'], '.4f'):>8}"
+            f"{format_value(result['iou'], '.4f'):>8}"
+            f"{format_value(result['agreement'], '.4f'):>8}"
+            f"{result['seconds_per_image']:>10.3f}"
+            f"{format_value(speedup, '.2f'):>9}"
+            f"{result['model_size'] / 1024 ** 2:>10.1f}"
+            f"{format_value(peak_memory, '.1f'):>10}")
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Create INT8 variants of an exported network and compare them with fp32")
+    parser.add_argument("architecture", choices=list(ONNX_ARCHITECTURES))
+    parser.add_argument("onnx", help="path to the fp32 ONNX file (cf cordobaOnnx.py)")
+    parser.add_argument("calibration", help="path to the calibration dataset (folders t1, t2)")
+    parser.add_argument("evaluation", help="path to the evaluation dataset (folders t1, t2, and optionally gt)")
+    parser.add_argument("--modes", nargs="+", choices=QUANTIZATION_MODES, default=list(QUANTIZATION_MODES))
+    parser.add_argument("--nb_calibration", type=int, default=32)
+    parser.add_argument("--calibration_size", type=int, default=256)
+    parser.add_argument("--report", default=None, help="path of the JSON report")
+    args = parser.parse_args()
+
+    report = create_quantization_report(
+        args.architecture, args.onnx, args.calibration, args.evaluation,
+        args.modes, args.nb_calibration, args.calibration_size)
+    print_quantization_report(report)
+    if args.report is not None:
+        with open(args.report, "w") as file:
+            json.dump(report, file, indent=2)
@@ -0,0 +1,144 @@
+import os
+import hashlib
+import threading
+import numpy
+
+
+class CordobaTileCache:
+    """
+    Class implementing a persistent on-disk cache of downloaded image chunks.
+    Chunks are stored as NPY files named after the hash of their content
+    description (content-addressed), the least recently used chunks are
+    evicted when the size of the cache exceeds its maximum size.
+    """
+
+    def __init__(self, path: str, max_size: int = 2 * 1024 ** 3):
+        """
+        Constructor for an instance of CordobaTileCache
+        path: path to the directory containing the cached chunks (created if
+        it doesn't exist)
+        max_size: maximum size of the cache in bytes (default: 2GB)
+        """
+        self.path = path
+        self.max_size = max_size
+        os.makedirs(path, exist_ok=True)
+
+        # Lock to avoid concurrent evictions from the download workers
+        self.lock = threading.Lock()
+
+        # Running total of the size of the cache in bytes, None until the
+        # first scan of the directory
+        self.total_size = None
+
+    def get_key(self, *parts) -> str:
+        """
+        Create the key of a chunk
+        parts: the values describing the content of the chunk
+        Return the key as an hexadecimal string
+        """
+        hash_key = hashlib.sha256()
+        for part in parts:
+            hash_key.update(repr(part).encode("utf-8"))
+            hash_key.update(b"\0")
+        return hash_key.hexdigest()
+
+    def get_path(self, key: str) -> str:
+        """
+        Return the path of the file of a chunk
+        key: the key of the chunk
+        """
+        return os.path.join(self.path, key[:2], f"{key}.npy")
+
+    def get(self, key: str) -> numpy.array:
+        """
+        Get a chunk from the cache
+        key: the key of the chunk
+        Return the chunk data as a numpy array, or None if the chunk is not in
+        the cache
+        """
+        path = self.get_path(key)
+        try:
+            data = numpy.load(path, allow_pickle=False)
+            # Update the modification time to memorise the last use
+            os.utime(path)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        return data
+
+    def put(self, key: str, data: numpy.array):
+        """
+        Add a chunk to the cache, and evict the least recently used chunks if
+        the cache is too large
+        key: the key of the chunk
+        data: the chunk data
+        """
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write in a temporary file first so that other processes never see a
+        # partially written chunk
+        path_tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(path_tmp, "wb") as file:
+            numpy.save(file, data, allow_pickle=False)
+        size = os.path.getsize(path_tmp)
+        with self.lock:
+            try:
+                size -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+            os.replace(path_tmp, path)
+            if self.total_size is not None:
+                self.total_size += size
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used chunks until the size of the cache is
+        below its maximum size. The cache directory is only scanned when the
+        running total exceeds the maximum size (or is not known yet), the scan
+        also accounts for the chunks written by other processes.
+        """
+        with self.lock:
+            if self.total_size is not None and self.total_size <= self.max_size:
+                return
+
+            # List the chunks with their size and last use
+            entries = []
+            total_size = 0
+            for dir_path, _, file_names in os.walk(self.path):
+                for file_name in file_names:
+                    if not file_name.endswith(".npy"):
+                        continue
+                    path = os.path.join(dir_path, file_name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total_size += stat.st_size
+
+            # Remove the oldest chunks first
+            entries.sort()
+            for _, size, path in entries:
+                if total_size <= self.max_size:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total_size -= size
+            self.total_size = total_size
+
+    def clear(self):
+        """
+        Remove all the chunks from the cache
+        """
+        with self.lock:
+            for dir_path, _, file_names in os.walk(self.path):
+                for file_name in file_names:
+                    if file_name.endswith(".npy"):
+                        try:
+                            os.remove(os.path.join(dir_path, file_name))
+                        except FileNotFoundError:
+                            pass
+            self.total_size = 0
@@ -0,0 +1,141 @@
+from typing import Callable, List
+import torch
+import torch.nn.functional as F
+
+
+class CordobaTiledInference:
+    """
+    Class implementing the tiled inference of a dense prediction network on
+    images of arbitrary size. The input images are cut into overlapping
+    windows, the windows are processed by mini-batches and the output logits
+    are blended back into a full resolution result, the contribution of each
+    window decreasing linearly toward its borders in the overlapping areas.
+    """
+
+    def __init__(self,
+        forward: Callable[..., torch.Tensor],
+        tile_size: int = 1024,
+        overlap: int = 128,
+        batch_size: int = 4,
+        size_multiple: int = 32):
+        """
+        Constructor for an instance of CordobaTiledInference
+        forward: function taking one batch tensor (batch, channels, tile,
+        tile) per input image and returning the logits as a tensor (batch,
+        nb_out_channels, tile, tile) (eg. for FCCDN:
+        lambda pre, post: model([pre, post])[0])
+        tile_size: size in pixels of the windows (default: 1024)
+        overlap: size in pixels of the overlap between adjacent windows
+        (default: 128)
+        batch_size: number of windows processed together (default: 4)
+        size_multiple: the windows size is always a multiple of this value,
+        as required by the down/up sampling of the networks (default: 32)
+        """
+        if overlap < 0 or overlap >= tile_size:
+            raise ValueError(f"overlap must be in [0, tile_size[, got {overlap}")
+        if tile_size % size_multiple != 0:
+            raise ValueError(f"tile_size must be a multiple of {size_multiple}, got {tile_size}")
+        self.forward = forward
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.size_multiple = size_multiple
+
+    def get_window_size(self, length: int) -> int:
+        """
+        Return the size of the windows along one dimension of the images.
+        Images smaller than the tile size are processed as a single window
+        of the smallest valid size instead of a full tile.
+        length: the size of the images along that dimension
+        """
+        size = -(-length // self.size_multiple) * self.size_multiple
+        return min(self.tile_size, size)
+
+    def get_window_origins(self, length: int, size: int) -> List[int]:
+        """
+        Return the positions of the windows along one dimension of the
+        images. The last window is aligned with the end of the images.
+        length: the size of the images along that dimension
+        size: the size of the windows along that dimension
+        """
+        if length <= size:
+            return [0]
+        step = size - self.overlap
+        origins = list(range(0, length - size, step))
+        origins.append(length - size)
+        return origins
+
+    def get_blending_weights(self, height: int, width: int) -> torch.Tensor:
+        """
+        Return the weights of the pixels of one window when blending the
+        logits, as a tensor (height, width). Weights increase linearly from
+        the borders over the overlap size and are 1 elsewhere.
+        height: the height of the windows
+        width: the width of the windows
+        """
+        def ramp(size):
+            if self.overlap == 0:
+                return torch.ones(size)
+            position = torch.arange(size, dtype=torch.float32)
+            distance = torch.minimum(position, size - 1 - position)
+            return ((distance + 0.5) / self.overlap).clamp(max=1.0)
+        return ramp(height)[:, None] * ramp(width)[None, :]
+
+    def predict(self, inputs: List[torch.Tensor]) -> torch.Tensor:
+        """
+        Run the tiled inference
+        inputs: the input images as tensors (channels, height, width), all of
+        the same height and width (eg. [pre, post] for change detection)
+        Return the blended logits as a tensor (nb_out_channels, height, width)
+        """
+        height, width = inputs[0].shape[-2:]
+
+        # Pad the images smaller than a window (reflection keeps the
+        # statistics of the border close to the image content)
+        window_height = self.get_window_size(height)
+        window_width = self.get_window_size(width)
+        pad_height = max(0, window_height - height)
+        pad_width = max(0, window_width - width)
+        if pad_height > 0 or pad_width > 0:
+            mode = "reflect" if pad_height < height and pad_width < width else "replicate"
+            inputs = [
+                F.pad(image[None], (0, pad_width, 0, pad_height), mode=mode)[0]
+                for image in inputs]
+        padded_height = height + pad_height
+        padded_width = width + pad_width
+
+        # Position of the windows
+        windows = [
+            (row, col)
+            for row in self.get_window_origins(padded_height, window_height)
+            for col in self.get_window_origins(padded_width, window_width)]
+        weights = self.get_blending_weights(window_height, window_width)
+
+        # Accumulators for the weighted logits and the sum of weights
+        logits = None
+        weights_sum = torch.zeros(padded_height, padded_width)
+
+        with torch.inference_mode():
+            for i_batch in range(0, len(windows), self.batch_size):
+                batch_windows = windows[i_batch:i_batch + self.batch_size]
+
+                # Stack the windows of each input image into one batch
+                batches = [
+                    torch.stack([
+                        image[:, row:row + window_height, col:col + window_width]
+                        for row, col in batch_windows])
+                    for image in inputs]
+                batch_logits = self.forward(*batches).float()
+
+                # Blend the logits of the windows into the result
+                if logits is None:
+                    logits = torch.zeros(
+                        batch_logits.shape[1], padded_height, padded_width)
+                for (row, col), window_logits in zip(batch_windows, batch_logits):
+                    logits[:, row:row + window_height, col:col + window_width] += \
+                        window_logits * weights
+                    weights_sum[row:row + window_height, col:col + window_width] += \
+                        weights
+
+            logits /= weights_sum
+        return logits[:, :height, :width]
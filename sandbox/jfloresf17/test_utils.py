@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+# utils imports the Earth Engine API at module level
+pytest.importorskip("ee")
+from utils import change_type_discrimination, direction_cosine
+
+
+def change_type_discrimination_loop(prob_t1, prob_t2, changed_mask, n_classes):
+    """Per pixel implementation the vectorized one must match"""
+    P = np.eye(n_classes)
+    height, width = prob_t1.shape[1], prob_t1.shape[2]
+    change_map = np.zeros((height, width), dtype=np.int32)
+    for i in range(height):
+        for j in range(width):
+            if not changed_mask[i, j]:
+                continue
+            delta_m = prob_t2[:, i, j] - prob_t1[:, i, j]
+            best_cos = -9999
+            best_transition = (0, 0)
+            for a in range(n_classes):
+                for b in range(n_classes):
+                    if a == b:
+                        continue
+                    cos_val = direction_cosine(delta_m, P[b] - P[a])
+                    if cos_val > best_cos:
+                        best_cos = cos_val
+                        best_transition = (a, b)
+            a, b = best_transition
+            change_map[i, j] = a * 100 + b
+    return change_map
+
+
+def test_change_type_discrimination_matches_loop():
+    n_classes, height, width = 4, 5, 6
+    rng = np.random.default_rng(0)
+    prob_t1 = rng.dirichlet(np.ones(n_classes), size=(height, width)).transpose(2, 0, 1)
+    prob_t2 = rng.dirichlet(np.ones(n_classes), size=(height, width)).transpose(2, 0, 1)
+    changed_mask = rng.random((height, width)) > 0.3
+
+    # No-data pixel and pixel without change vector
+    prob_t2[:, 0, 0] = np.nan
+    changed_mask[0, 0] = True
+    prob_t2[:, 1, 1] = prob_t1[:, 1, 1]
+    changed_mask[1, 1] = True
+
+    expected = change_type_discrimination_loop(prob_t1, prob_t2, changed_mask, n_classes)
+    result = change_type_discrimination(prob_t1, prob_t2, changed_mask, n_classes, block_rows=2)
+
+    assert result[0, 0] == 0
+    assert result[1, 1] == 0
+    np.testing.assert_array_equal(result, expected)
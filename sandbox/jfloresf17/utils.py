@@ -335,6 +335,97 @@ def compute_Lk(magnitude: np.ndarray,
     return Lk_value
 
 
+## Precompute the cumulative counts to evaluate Lk for any threshold
+def build_Lk_index(magnitude: np.ndarray,
+                   class_t1: np.ndarray,
+                   class_t2: np.ndarray) -> dict:
+    """
+    Build an index to compute Lk for any threshold with a binary search.
+    The magnitude is sorted once and the cumulative number of true change
+    pixels is computed along the sorted magnitude.
+
+    Args:
+    magnitude (np.ndarray): Magnitude of the change
+    class_t1 (np.ndarray): Land cover class at time t1.
+    class_t2 (np.ndarray): Land cover class at time t2.
+
+    Returns:
+    dict: The index, with the sorted magnitude ('magnitude'), the cumulative
+          number of true change pixels below each position ('cum_change', one
+          more element than 'magnitude') and the total number of true change
+          pixels ('A').
+    """
+    magnitude = np.asarray(magnitude).ravel()
+    true_change = (np.asarray(class_t1) != np.asarray(class_t2)).ravel()
+
+    # A: all the pixels that changed, pixels without magnitude (NaN) can't be
+    # detected and are excluded from the sorted values
+    A = np.count_nonzero(true_change)
+    valid = ~np.isnan(magnitude)
+    order = np.argsort(magnitude[valid], kind='stable')
+    sorted_magnitude = magnitude[valid][order]
+    cum_change = np.zeros(len(sorted_magnitude) + 1, dtype=np.int64)
+    np.cumsum(true_change[valid][order], out=cum_change[1:])
+
+    return {'magnitude': sorted_magnitude, 'cum_change': cum_change, 'A': A}
+
+
+def compute_Lk_index(index: dict, threshold) -> np.ndarray:
+    """
+    Calculate Lk for one or several thresholds using an index built by
+    build_Lk_index, in O(log n) per threshold. Same result as compute_Lk.
+
+    Args:
+    index (dict): Index built by build_Lk_index.
+    threshold (float or np.ndarray): Threshold(s) to consider a pixel as changed.
+
+    Returns:
+    np.ndarray: Lk value(s). -9999.0 if there is no true change.
+    """
+    if index['A'] == 0:
+        return np.full(np.shape(threshold), -9999.0)
+
+    # Position of the first pixel detected as changed (magnitude >= threshold)
+    k = np.searchsorted(index['magnitude'], threshold, side='left')
+    n_detected = len(index['magnitude']) - k
+
+    # Ak1: detected and true change, Ak2: detected and true no change
+    Ak1 = index['cum_change'][-1] - index['cum_change'][k]
+    Ak2 = n_detected - Ak1
+
+    return ((Ak1 - Ak2) * 100.0) / index['A']
+
+
+## Exact threshold optimization over all the magnitude values
+def threshold_optimization_exact(
+    magnitude: np.ndarray,
+    class_t1: np.ndarray,
+    class_t2: np.ndarray
+) -> tuple[float, float, np.ndarray, np.ndarray]:
+    """
+    Threshold optimization maximizing Lk over all the distinct magnitude values,
+    which are the only thresholds where Lk changes.
+
+    Parameters:
+    magnitude (np.ndarray): Magnitude of the change vector.
+    class_t1 (np.ndarray): Land cover class at time t1.
+    class_t2 (np.ndarray): Land cover class at time t2.
+
+    Returns:
+    tuple[float, float, np.ndarray, np.ndarray]: The best threshold, the best Lk
+                                                 value, and the Lk curve as the
+                                                 thresholds and their Lk values.
+    """
+    index = build_Lk_index(magnitude, class_t1, class_t2)
+    thresholds = np.unique(index['magnitude'])
+    if len(thresholds) == 0:
+        return np.nan, -9999.0, thresholds, np.zeros(0)
+
+    Lk_values = compute_Lk_index(index, thresholds)
+    best = int(np.argmax(Lk_values))
+    return thresholds[best], Lk_values[best], thresholds, Lk_values
+
+
 ## Implement a simple threshold optimization
 def threshold_optimization(
     magnitude: np.ndarray,
@@ -343,10 +434,12 @@ def threshold_optimization(
     step_coarse: float = 0.1,
     step_fine: float = 0.01,
     tolerance: float = 1e-3,
-    max_iterations: int = 10
+    max_iterations: int = 10,
+    method: str = 'iterative'
 ) -> tuple[float, float]:
     """
     Threshold optimization using a simple search algorithm to maximize Lk.
+    With method='exact', use threshold_optimization_exact instead.
 
     Parameters:
     magnitude (np.ndarray): Magnitude of the change vector.
@@ -356,11 +449,17 @@ def threshold_optimization(
     step_fine (float): Fine step for the local search. Default: 0.01.
     tolerance (float): Minimum improvement in Lk to continue iterating. Default: 1e-3.
     max_iterations (int): Maximum number of iterations. Default: 10.
+    method (str): 'iterative' for the coarse/fine search, 'exact' for the search
+                  over all the magnitude values. Default: 'iterative'.
 
     Returns:
     tuple[float, float]: The best threshold and the best Lk value.
     """
 
+    if method == 'exact':
+        best_threshold, best_Lk, _, _ = threshold_optimization_exact(magnitude, class_t1, class_t2)
+        return best_threshold, best_Lk
+
     # 1) Determine the range of magnitude
     vmin, vmax = np.min(magnitude), np.max(magnitude)
     
@@ -448,77 +547,86 @@ def direction_cosine(delta_m: np.ndarray,
     return np.dot(delta_m, delta_p) / (norm_m * norm_p)
 
 
+def build_transition_matrix(n_classes: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Build the matrix of the transition vectors between classes.
+    The transition vector a->b is P_b - P_a, where P_i is the "pure" vector of
+    the class i (P_0 = (1, 0, 0, ...), P_1 = (0, 1, 0, ...) etc.).
+
+    Args:
+    n_classes (int): Number of classes (e.g., 9).
+
+    Returns:
+    tuple[np.ndarray, np.ndarray]: The transition vectors (n*(n-1), n), one per
+                                   row in the (a, b) order with a != b, and the
+                                   codes a * 100 + b of the transitions.
+    """
+    P = np.eye(n_classes)
+    transitions = [(a, b) for a in range(n_classes) for b in range(n_classes) if a != b]
+    vectors = np.array([P[b] - P[a] for a, b in transitions]).reshape(-1, n_classes)
+    codes = np.array([a * 100 + b for a, b in transitions], dtype=np.int32)
+    return vectors, codes
+
+
 def change_type_discrimination(prob_t1: np.ndarray,
                                prob_t2: np.ndarray,
                                changed_mask: np.ndarray,
-                               n_classes: int
+                               n_classes: int,
+                               block_rows: int = 256
     ) -> np.ndarray:
     """
     Assign the change type (class transition) for pixels that changed.
 
+    For each changed pixel, the cosines between Delta M = p2 - p1 and all the
+    transition vectors are computed with one matrix product, and the transition
+    with the highest cosine is selected. The raster is processed per block of
+    rows to bound the memory used.
+
     Args:
     prob_t1 (np.ndarray): Array (n, height, width) with probabilities at t1.
     prob_t2 (np.ndarray): Array (n, height, width) with probabilities at t2.
     changed_mask (np.ndarray): Array (height, width) boolean (True = changed).
     n_classes (int): Number of classes (e.g., 9).
+    block_rows (int): Number of rows processed at once. Default: 256.
 
     Returns:
     np.ndarray: Change map (height, width), where each "changed" pixel has a code
                 of transition a->b, and the unchanged pixels have 0.
     """
-        
-    # 1) Pre calculate the transition vectors
-    # We use a dictionary with key=(a,b), value=delta_p_ab
-    transition_vectors = {}
-    
-    # Generate "pure" vectors for each class
-    # P_0 = (1, 0, 0, ...), P_1 = (0, 1, 0, ...) etc.
-    P = np.eye(n_classes)
-    
-    for a in range(n_classes):
-        for b in range(n_classes):
-            if a != b:
-                delta_ab = P[b] - P[a]
-                transition_vectors[(a, b)] = delta_ab
-            else:
-                transition_vectors[(a, b)] = None  # No transition (a->a)
-    
+
+    # 1) Pre calculate the transition vectors, all of norm sqrt(2)
+    transition_vectors, transition_codes = build_transition_matrix(n_classes)
+    norm_p = np.linalg.norm(transition_vectors, axis=1)
+
     # 2) Create an empty change map
     height, width = prob_t1.shape[1], prob_t1.shape[2]
     change_map = np.zeros((height, width), dtype=np.int32)
-    
-    # 3) For each changed pixel, calculate Delta M and find the transition with the highest cosine
-    for i in range(height):
-        for j in range(width):
-            if changed_mask[i, j]:
-                # Extract the probability vectors at t1 and t2
-                p1 = prob_t1[:, i, j]  # shape (n_classes,)
-                p2 = prob_t2[:, i, j]
-                
-                # Delta M
-                delta_m = p2 - p1
-                
-                # Search for the transition (a->b) with the highest cosine
-                best_cos = -9999
-                best_transition = (0,0)
-                
-                for (a, b), delta_ab in transition_vectors.items():
-                    if delta_ab is None:
-                        continue
-                    cos_val = direction_cosine(delta_m, delta_ab)
-                    if cos_val > best_cos:
-                        best_cos = cos_val
-                        best_transition = (a, b)
-                
-                # Code the transition a->b as a number, e.g. a * 100 + b
-                a, b = best_transition
-                transition_code = a * 100 + b
-                
-                change_map[i, j] = transition_code
-            else:
-                # Unchanged pixel
-                change_map[i, j] = 0 
-    
+    if len(transition_codes) == 0:
+        return change_map
+
+    # 3) For each block of rows, calculate Delta M of the changed pixels and
+    # find the transition with the highest cosine
+    for row_from in range(0, height, block_rows):
+        row_to = min(row_from + block_rows, height)
+        mask = np.asarray(changed_mask[row_from:row_to], dtype=bool)
+        if not mask.any():
+            continue
+
+        # Delta M of the changed pixels, shape (m, n_classes)
+        delta_m = (prob_t2[:, row_from:row_to][:, mask] -
+                   prob_t1[:, row_from:row_to][:, mask]).T
+        norm_m = np.linalg.norm(delta_m, axis=1)
+
+        # Cosines with all the transitions, shape (m, n*(n-1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cos_val = (delta_m @ transition_vectors.T) / (norm_m[:, None] * norm_p[None, :])
+
+        # The first transition with the highest cosine, pixels without change
+        # vector (null or non finite Delta M, eg. no-data pixels) keep the code 0
+        codes = transition_codes[np.argmax(cos_val, axis=1)]
+        codes[~np.isfinite(norm_m) | (norm_m < 1e-12)] = 0
+        change_map[row_from:row_to][mask] = codes
+
     return change_map
 
 
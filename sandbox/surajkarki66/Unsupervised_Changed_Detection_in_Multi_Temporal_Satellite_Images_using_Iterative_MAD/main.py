@@ -3,6 +3,7 @@ import numpy as np
 
 from sklearn.cluster import KMeans
 from numpy.linalg import inv, eig
+from scipy.linalg import cho_factor, cho_solve, eigh
 from scipy.stats import chi2
 
 from utils import covw
@@ -71,6 +72,113 @@ def IRMAD(img_X, img_Y, max_iter=50, epsilon=1e-3):
            sigma_11, sigma_22, sigma_12, chi_square_dis, weight
 
 
+def IRMAD_streaming(img_X, img_Y, max_iter=50, epsilon=1e-3, block_size=1000000,
+                    mad_out=None, chi2_out=None, weight_out=None):
+    """
+    IR-MAD processing the pixels per block, for images too large for IRMAD
+    :param img_X: image at t1, shape (bands, height * width), can be a memory-mapped array
+    :param img_Y: image at t2, shape (bands, height * width), can be a memory-mapped array
+    :param max_iter: max number of iterations
+    :param epsilon: convergence threshold on the canonical correlations
+    :param block_size: number of pixels processed at once, bounds the peak memory
+    :param mad_out: optional output array (bands, height * width) for the MAD variates
+    :param chi2_out: optional output array (1, height * width) for the chi-square distance
+    :param weight_out: optional output array (1, height * width) for the no-change weight
+    :return: same as IRMAD, the output arrays are float32 arrays if not given
+    """
+    bands_count_X, num = img_X.shape
+
+    # shift the data by the mean of the first block for numerical stability of the
+    # accumulated moments
+    shift = np.concatenate((img_X[:, :block_size], img_Y[:, :block_size]), axis=0)
+    shift = shift.astype(np.float64).mean(axis=1, keepdims=True)
+
+    def get_block(start):
+        end = min(start + block_size, num)
+        V = np.concatenate((img_X[:, start:end], img_Y[:, start:end]), axis=0).astype(np.float64)
+        return V - shift, end
+
+    def get_mad_variates(V, mean, eigenvector_X, eigenvector_Y):
+        center = V - mean
+        return np.dot(eigenvector_X.T, center[:bands_count_X]) - np.dot(eigenvector_Y.T, center[bands_count_X:])
+
+    # transformation of the previous iteration, used to compute the weights on the fly
+    previous = None
+    can_corr = 100 * np.ones((bands_count_X, 1))
+    for _iter in range(max_iter):
+        # accumulate the weighted moments over the blocks
+        sum_w = 0.0
+        sum_wV = np.zeros((2 * bands_count_X, 1))
+        sum_wVV = np.zeros((2 * bands_count_X, 2 * bands_count_X))
+        start = 0
+        while start < num:
+            V, end = get_block(start)
+            if previous is None:
+                weight = np.ones((1, V.shape[1]))
+            else:
+                mad_variates = get_mad_variates(V, *previous)
+                chi_square_dis = np.sum(mad_variates * mad_variates / mad_var, axis=0, keepdims=True)
+                weight = chi2.sf(chi_square_dis, bands_count_X)
+            sum_w += weight.sum()
+            sum_wV += np.dot(V, weight.T)
+            sum_wVV += np.dot(V * weight, V.T)
+            start = end
+
+        mean = sum_wV / sum_w
+        cov_XY = (sum_wVV / sum_w - np.dot(mean, mean.T)) * (num / (num - 1))
+        sigma_11 = cov_XY[0:bands_count_X, 0:bands_count_X]
+        sigma_22 = cov_XY[bands_count_X:, bands_count_X:]
+        sigma_12 = cov_XY[0:bands_count_X, bands_count_X:]
+        sigma_21 = sigma_12.T
+
+        # generalized symmetric eigenproblem sigma_12 inv(sigma_22) sigma_21 a = rho^2 sigma_11 a,
+        # eigh sorts the eigenvalues and normalizes the eigenvectors so that a' sigma_11 a = 1
+        cho_22 = cho_factor(sigma_22)
+        target_mat = np.dot(sigma_12, cho_solve(cho_22, sigma_21))
+        eigenvalue, eigenvector_X = eigh((target_mat + target_mat.T) / 2, sigma_11)
+        eigenvalue = np.sqrt(np.clip(eigenvalue, 0.0, 1.0)).reshape(bands_count_X, 1)
+
+        if (_iter + 1) == 1:
+            print('Canonical correlations')
+        print(eigenvalue.ravel())
+
+        eigenvector_Y = cho_solve(cho_22, np.dot(sigma_21, eigenvector_X))  # the eigenvector of image Y
+        norm_Y = np.sqrt(1 / np.diag(np.dot(eigenvector_Y.T, np.dot(sigma_22, eigenvector_Y))))
+        eigenvector_Y = norm_Y * eigenvector_Y
+
+        converged = np.max(np.abs(can_corr - eigenvalue)) < epsilon
+        can_corr = eigenvalue
+        mad_var = np.reshape(2 * (1 - can_corr), (bands_count_X, 1))
+        previous = (mean, eigenvector_X, eigenvector_Y)
+        if converged:
+            break
+
+    if (_iter + 1) == max_iter:
+        print('the canonical correlation may not be converged')
+    else:
+        print('the canonical correlation is converged, the iteration is %d' % (_iter + 1))
+
+    # compute the per pixel outputs with the final transformation
+    if mad_out is None:
+        mad_out = np.empty((bands_count_X, num), dtype=np.float32)
+    if chi2_out is None:
+        chi2_out = np.empty((1, num), dtype=np.float32)
+    if weight_out is None:
+        weight_out = np.empty((1, num), dtype=np.float32)
+    start = 0
+    while start < num:
+        V, end = get_block(start)
+        mad_variates = get_mad_variates(V, *previous)
+        chi_square_dis = np.sum(mad_variates * mad_variates / mad_var, axis=0, keepdims=True)
+        mad_out[:, start:end] = mad_variates
+        chi2_out[:, start:end] = chi_square_dis
+        weight_out[:, start:end] = chi2.sf(chi_square_dis, bands_count_X)
+        start = end
+
+    return mad_out, can_corr, mad_var, eigenvector_X, eigenvector_Y, \
+           sigma_11, sigma_22, sigma_12, chi2_out, weight_out
+
+
 def get_binary_change_map(data):
     """
     get binary change map
@@ -2,49 +2,39 @@ import cv2
 import numpy as np
 import imageio.v2 as imageio
 
-from sklearn.cluster import KMeans
+from numpy.lib.stride_tricks import sliding_window_view
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.decomposition import PCA
 from collections import Counter
 from PIL import Image
 
 def find_vector_set(diff_image, new_size):
-    i = 0
-    j = 0
-    vector_set = np.zeros((int(new_size[0] * new_size[1] / 25), 25))
+    # Non overlapping 5x5 blocks of the difference image, one block per row
+    blocks = diff_image[:new_size[0], :new_size[1]].reshape(new_size[0] // 5, 5, new_size[1] // 5, 5)
+    vector_set = blocks.transpose(0, 2, 1, 3).reshape(-1, 25).astype(np.float64)
 
     print('\nvector_set shape', vector_set.shape)
 
-    while i < vector_set.shape[0]:
-        while j < new_size[0]:
-            k = 0
-            while k < new_size[1]:
-                block = diff_image[j:j+5, k:k+5]
-                feature = block.ravel()
-                vector_set[i, :] = feature
-                k = k + 5
-            j = j + 5
-        i = i + 1
-
     mean_vec = np.mean(vector_set, axis=0)
     vector_set = vector_set - mean_vec
 
     return vector_set, mean_vec
 
+def iter_FVS(EVS, diff_image, mean_vec, new, tile_rows=256):
+    # 5x5 neighbourhood of every pixel at more than 2 pixels from the border, as a view
+    # (no copy) of shape (new[0] - 4, new[1] - 4, 5, 5)
+    windows = sliding_window_view(diff_image[:new[0], :new[1]], (5, 5))
+
+    # Project the neighbourhoods per tile of rows to bound the memory
+    for row_from in range(0, windows.shape[0], tile_rows):
+        row_to = min(row_from + tile_rows, windows.shape[0])
+        features = windows[row_from:row_to].reshape(-1, 25)
+        FVS = np.dot(features, EVS)
+        FVS -= mean_vec
+        yield row_from, row_to, FVS
+
 def find_FVS(EVS, diff_image, mean_vec, new):
-    i = 2
-    feature_vector_set = []
-
-    while i < new[0] - 2:
-        j = 2
-        while j < new[1] - 2:
-            block = diff_image[i-2:i+3, j-2:j+3]
-            feature = block.flatten()
-            feature_vector_set.append(feature)
-            j = j + 1
-        i = i + 1
-
-    FVS = np.dot(feature_vector_set, EVS)
-    FVS = FVS - mean_vec
+    FVS = np.concatenate([FVS for _, _, FVS in iter_FVS(EVS, diff_image, mean_vec, new)])
     print("\nfeature vector space size", FVS.shape)
     return FVS
 
@@ -60,7 +50,25 @@ def clustering(FVS, components, new):
 
     return least_index, change_map
 
-def find_change_map(image1, image2):
+def clustering_tiled(EVS, diff_image, mean_vec, components, new, tile_rows=256, batch_size=4096):
+    # Fit a mini-batch K-Means on the feature vectors of each tile, then label each tile,
+    # the feature vector space is never fully in memory
+    kmeans = MiniBatchKMeans(components, batch_size=batch_size, n_init=3, random_state=0)
+    for _, _, FVS in iter_FVS(EVS, diff_image, mean_vec, new, tile_rows):
+        kmeans.partial_fit(FVS)
+
+    change_map = np.zeros((new[0] - 4, new[1] - 4), dtype=np.int32)
+    for row_from, row_to, FVS in iter_FVS(EVS, diff_image, mean_vec, new, tile_rows):
+        change_map[row_from:row_to] = kmeans.predict(FVS).reshape(row_to - row_from, -1)
+    count = np.bincount(change_map.ravel(), minlength=components)
+
+    least_index = int(np.argmin(count))
+
+    return least_index, change_map
+
+def find_change_map(image1, image2, tile_rows=None):
+    # With tile_rows, the feature vectors are computed and clustered per tile of rows
+    # with a mini-batch K-Means, to process large images with a bounded memory
     
     print(image1.shape, image2.shape)
 
@@ -82,12 +90,17 @@ def find_change_map(image1, image2):
     pca.fit(vector_set)
     EVS = pca.components_
 
-    FVS = find_FVS(EVS, diff_image, mean_vec, new_size)
+    components = 3
+    if tile_rows is None:
+        FVS = find_FVS(EVS, diff_image, mean_vec, new_size)
 
-    print('\ncomputing k means')
+        print('\ncomputing k means')
 
-    components = 3
-    least_index, change_map = clustering(FVS, components, new_size)
+        least_index, change_map = clustering(FVS, components, new_size)
+    else:
+        print('\ncomputing mini-batch k means')
+
+        least_index, change_map = clustering_tiled(EVS, diff_image, mean_vec, components, new_size, tile_rows)
 
     change_map[change_map == least_index] = 255
     change_map[change_map != 255] = 0